@@ -1,13 +1,23 @@
 # Модуль для сохранения результатов конвертации документов
 # Обрабатывает различные форматы вывода (Markdown, HTML, JSON) и сохраняет изображения
 
+import codecs
 import json
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import FrozenSet, Optional
 
 from bs4 import BeautifulSoup, Tag
 from pydantic import BaseModel
 from PIL import Image
 
+try:
+    # orjson - опциональная зависимость, заметно быстрее сериализует большие деревья блоков
+    import orjson
+except ImportError:
+    orjson = None
+
 # Импортируем типы выходных данных для различных renderers
 from marker.renderers.extraction import ExtractionOutput
 from marker.renderers.html import HTMLOutput
@@ -18,6 +28,10 @@ from marker.schema.blocks import BlockOutput
 from marker.settings import settings
 
 
+# Единственный внешний <p> тег, охватывающий весь HTML фрагмент
+_OUTER_P_RE = re.compile(r"\A<p\b[^>]*>(.*)</p>\Z", re.DOTALL | re.IGNORECASE)
+
+
 def unwrap_outer_tag(html: str):
     """
     Удаляет внешний тег <p> из HTML, если он единственный.
@@ -29,7 +43,19 @@ def unwrap_outer_tag(html: str):
     Возвращает:
         Обработанная HTML строка без внешнего <p> тега
     """
-    # Парсим HTML с помощью BeautifulSoup
+    # Быстрый путь: проверяем структуру регулярным выражением без построения DOM
+    match = _OUTER_P_RE.match(html)
+    if match is None:
+        # Внешний элемент не является единственным <p> тегом
+        return html
+
+    inner = match.group(1)
+    lowered = inner.lower()
+    if "<p" not in lowered and "</p" not in lowered:
+        # Вложенных <p> нет, значит совпадение действительно внешний тег
+        return inner
+
+    # Редкий случай с вложенными <p> - разбираем через BeautifulSoup
     soup = BeautifulSoup(html, "html.parser")
     # Получаем список всех элементов верхнего уровня
     contents = list(soup.contents)
@@ -85,6 +111,24 @@ def json_to_html(block: JSONBlockOutput | BlockOutput):
         return str(soup)
 
 
+def _list_output_dir(output_dir: str) -> FrozenSet[str]:
+    """
+    Возвращает множество имен файлов в директории.
+
+    Аргументы:
+        output_dir: Директория для листинга
+
+    Возвращает:
+        frozenset имен файлов (пустой, если директория не существует)
+    """
+    # Один проход os.scandir вместо отдельного stat на каждое расширение
+    try:
+        with os.scandir(output_dir) as it:
+            return frozenset(entry.name for entry in it)
+    except (FileNotFoundError, NotADirectoryError):
+        return frozenset()
+
+
 def output_exists(output_dir: str, fname_base: str):
     """
     Проверяет, существует ли уже файл с результатами конвертации.
@@ -98,12 +142,36 @@ def output_exists(output_dir: str, fname_base: str):
     """
     # Список поддерживаемых расширений файлов
     exts = ["md", "html", "json"]
-    # Проверяем наличие файла с каждым расширением
-    for ext in exts:
-        if os.path.exists(os.path.join(output_dir, f"{fname_base}.{ext}")):
-            return True
-    # Не найдено ни одного файла
-    return False
+    # Проверяем наличие файла с каждым расширением по одному листингу директории
+    names = _list_output_dir(output_dir)
+    return any(f"{fname_base}.{ext}" in names for ext in exts)
+
+
+def _json_output_types():
+    """
+    Возвращает типы результатов, которые сериализуются в JSON целиком (без metadata).
+    """
+    # Импортируем здесь, чтобы избежать циклических импортов
+    from marker.renderers.chunk import ChunkOutput  # Has an import from this file
+
+    return (JSONOutput, ChunkOutput, OCRJSONOutput)
+
+
+def dump_rendered_json(rendered: BaseModel) -> bytes:
+    """
+    Сериализует отрендеренный результат в JSON (UTF-8 байты) без metadata.
+    Использует orjson, если он установлен, иначе встроенный JSON-энкодер pydantic.
+
+    Аргументы:
+        rendered: Отрендеренный результат (JSONOutput, ChunkOutput или OCRJSONOutput)
+
+    Возвращает:
+        JSON с отступом в 2 пробела в виде байтов
+    """
+    if orjson is not None:
+        data = rendered.model_dump(mode="json", exclude={"metadata"})
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return rendered.model_dump_json(exclude={"metadata"}, indent=2).encode("utf-8")
 
 
 def text_from_rendered(rendered: BaseModel):
@@ -125,9 +193,6 @@ def text_from_rendered(rendered: BaseModel):
     Raises:
         ValueError: Если тип результата не поддерживается
     """
-    # Импортируем здесь, чтобы избежать циклических импортов
-    from marker.renderers.chunk import ChunkOutput  # Has an import from this file
-
     # Определяем тип результата и возвращаем соответствующие данные
     if isinstance(rendered, MarkdownOutput):
         # Markdown формат - возвращаем markdown текст и изображения
@@ -135,15 +200,9 @@ def text_from_rendered(rendered: BaseModel):
     elif isinstance(rendered, HTMLOutput):
         # HTML формат - возвращаем HTML текст и изображения
         return rendered.html, "html", rendered.images
-    elif isinstance(rendered, JSONOutput):
-        # JSON формат - сериализуем модель в JSON (без metadata)
-        return rendered.model_dump_json(exclude=["metadata"], indent=2), "json", {}
-    elif isinstance(rendered, ChunkOutput):
-        # Chunks формат - сериализуем модель в JSON (без metadata)
-        return rendered.model_dump_json(exclude=["metadata"], indent=2), "json", {}
-    elif isinstance(rendered, OCRJSONOutput):
-        # OCR JSON формат - сериализуем модель в JSON (без metadata)
-        return rendered.model_dump_json(exclude=["metadata"], indent=2), "json", {}
+    elif isinstance(rendered, _json_output_types()):
+        # JSON, Chunks и OCR JSON форматы - сериализуем модель в JSON (без metadata)
+        return dump_rendered_json(rendered).decode("utf-8"), "json", {}
     elif isinstance(rendered, ExtractionOutput):
         # Extraction формат - возвращаем JSON документа
         return rendered.document_json, "json", {}
@@ -152,22 +211,48 @@ def text_from_rendered(rendered: BaseModel):
         raise ValueError("Invalid output type")
 
 
-def convert_if_not_rgb(image: Image.Image) -> Image.Image:
+# Форматы, которые умеют хранить альфа-канал и оттенки серого без конвертации в RGB
+_ALPHA_IMAGE_FORMATS = {"PNG", "WEBP", "TIFF"}
+# Режимы изображений, которые такие форматы сохраняют напрямую
+_ALPHA_FORMAT_MODES = {"RGB", "RGBA", "L", "LA"}
+
+
+def convert_if_not_rgb(
+    image: Image.Image, target_format: Optional[str] = None
+) -> Image.Image:
     """
-    Конвертирует изображение в RGB режим, если оно в другом режиме.
+    Конвертирует изображение в RGB режим, если это требуется целевым форматом.
     Необходимо для сохранения в JPEG (формат не поддерживает RGBA и другие режимы).
     
     Аргументы:
         image: PIL изображение
+        target_format: Формат, в котором изображение будет сохранено (например, "JPEG").
+            Если формат поддерживает альфа-канал (PNG, WEBP, TIFF), изображение
+            возвращается без копирования. None - всегда приводить к RGB
         
     Возвращает:
-        PIL изображение в RGB режиме
+        PIL изображение, пригодное для сохранения в target_format
     """
+    # Форматы с поддержкой прозрачности сохраняют RGBA/L как есть, без лишней копии
+    if (
+        target_format is not None
+        and target_format.upper() in _ALPHA_IMAGE_FORMATS
+        and image.mode in _ALPHA_FORMAT_MODES
+    ):
+        return image
+
     # Проверяем режим изображения
-    if image.mode != "RGB":
-        # Конвертируем в RGB (например, RGBA -> RGB)
-        image = image.convert("RGB")
-    return image
+    if image.mode == "RGB":
+        return image
+
+    if image.mode == "RGBA":
+        # Накладываем на белый фон, чтобы прозрачные области не стали черными
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+
+    # Конвертируем в RGB (например, CMYK -> RGB)
+    return image.convert("RGB")
 
 
 def save_output(rendered: BaseModel, output_dir: str, fname_base: str):
@@ -184,21 +269,29 @@ def save_output(rendered: BaseModel, output_dir: str, fname_base: str):
         output_dir: Директория для сохранения файлов
         fname_base: Базовое имя файла (без расширения)
     """
-    # Извлекаем текст, расширение и изображения из результата
-    text, ext, images = text_from_rendered(rendered)
-    # Перекодируем текст с обработкой ошибок (заменяем неподдерживаемые символы)
-    # Это предотвращает ошибки при наличии специальных символов
-    text = text.encode(settings.OUTPUT_ENCODING, errors="replace").decode(
-        settings.OUTPUT_ENCODING
-    )
+    # JSON результаты сериализуем сразу в байты и пишем напрямую,
+    # минуя промежуточную строку и цикл encode/decode
+    is_utf8 = codecs.lookup(settings.OUTPUT_ENCODING).name == "utf-8"
+    if is_utf8 and isinstance(rendered, _json_output_types()):
+        with open(os.path.join(output_dir, f"{fname_base}.json"), "wb") as f:
+            f.write(dump_rendered_json(rendered))
+        images = {}
+    else:
+        # Извлекаем текст, расширение и изображения из результата
+        text, ext, images = text_from_rendered(rendered)
+        # Перекодируем текст с обработкой ошибок (заменяем неподдерживаемые символы)
+        # Это предотвращает ошибки при наличии специальных символов
+        text = text.encode(settings.OUTPUT_ENCODING, errors="replace").decode(
+            settings.OUTPUT_ENCODING
+        )
 
-    # Сохраняем основной файл с результатом конвертации
-    with open(
-        os.path.join(output_dir, f"{fname_base}.{ext}"),
-        "w+",
-        encoding=settings.OUTPUT_ENCODING,
-    ) as f:
-        f.write(text)
+        # Сохраняем основной файл с результатом конвертации
+        with open(
+            os.path.join(output_dir, f"{fname_base}.{ext}"),
+            "w+",
+            encoding=settings.OUTPUT_ENCODING,
+        ) as f:
+            f.write(text)
     
     # Сохраняем метаданные в отдельный JSON файл
     # Содержит оглавление, статистику по страницам и другую информацию
@@ -210,8 +303,27 @@ def save_output(rendered: BaseModel, output_dir: str, fname_base: str):
         f.write(json.dumps(rendered.metadata, indent=2))
 
     # Сохраняем все извлеченные изображения
-    for img_name, img in images.items():
-        # Конвертируем в RGB если необходимо (RGBA нельзя сохранить как JPG)
-        img = convert_if_not_rgb(img)  # RGBA images can't save as JPG
-        # Сохраняем изображение в указанном формате (по умолчанию JPEG)
-        img.save(os.path.join(output_dir, img_name), settings.OUTPUT_IMAGE_FORMAT)
+    # Кодировщики PIL отпускают GIL, поэтому потоки дают реальный параллелизм
+    if images:
+        with ThreadPoolExecutor(max_workers=min(8, len(images))) as executor:
+            list(
+                executor.map(
+                    lambda item: _save_image(item[1], output_dir, item[0]),
+                    images.items(),
+                )
+            )
+
+
+def _save_image(img: Image.Image, output_dir: str, img_name: str):
+    """
+    Сохраняет одно изображение в выходную директорию.
+
+    Аргументы:
+        img: PIL изображение
+        output_dir: Директория для сохранения
+        img_name: Имя файла изображения
+    """
+    # Конвертируем в RGB если необходимо (RGBA нельзя сохранить как JPG)
+    img = convert_if_not_rgb(img, settings.OUTPUT_IMAGE_FORMAT)  # RGBA images can't save as JPG
+    # Сохраняем изображение в указанном формате (по умолчанию JPEG)
+    img.save(os.path.join(output_dir, img_name), settings.OUTPUT_IMAGE_FORMAT)
@@ -192,6 +192,19 @@ class BaseProvider:
         """
         return self
 
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Выход из контекстного менеджера: освобождает ресурсы провайдера.
+        """
+        self.close()
+
+    def close(self):
+        """
+        Освобождает ресурсы провайдера (временные файлы и т.п.).
+        Базовая реализация ничего не делает.
+        """
+        pass
+
     @staticmethod
     def get_font_css():
         """
@@ -10,15 +10,14 @@
 """
 
 import base64
-import os
 import re
-import tempfile
 from io import BytesIO
 
 from PIL import Image
 from marker.logger import get_logger
 
 from marker.providers.pdf import PdfProvider
+from marker.providers.utils import create_temp_pdf
 
 # Инициализируем логгер для записи ошибок и отладочной информации
 logger = get_logger()
@@ -85,9 +84,10 @@ class DocumentProvider(PdfProvider):
             config: Конфигурация провайдера (опционально)
         """
         # Создаем временный PDF файл для промежуточного хранения
-        temp_pdf = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-        self.temp_pdf_path = temp_pdf.name
-        temp_pdf.close()
+        # PdfProvider (и pdftext) читают документ по пути, поэтому без файла не обойтись,
+        # но по возможности он создается в tmpfs, минуя диск.
+        # Файл удаляется автоматически при уничтожении провайдера
+        self.temp_pdf_path = create_temp_pdf(self)
 
         # Конвертируем DOCX в PDF
         try:
@@ -99,15 +99,6 @@ class DocumentProvider(PdfProvider):
         # Инициализируем родительский PdfProvider с временным PDF файлом
         super().__init__(self.temp_pdf_path, config)
 
-    def __del__(self):
-        """
-        Деструктор для очистки временных файлов.
-        
-        Удаляет временный PDF файл при уничтожении объекта.
-        """
-        if os.path.exists(self.temp_pdf_path):
-            os.remove(self.temp_pdf_path)
-
     def convert_docx_to_pdf(self, filepath: str):
         """
         Конвертирует DOCX документ в PDF формат.
@@ -10,12 +10,11 @@
 """
 
 import base64
-import os
-import tempfile
 
 from bs4 import BeautifulSoup
 
 from marker.providers.pdf import PdfProvider
+from marker.providers.utils import create_temp_pdf
 
 # CSS стили для конвертации HTML в PDF
 # Определяют внешний вид книги при конвертации из EPUB
@@ -79,9 +78,10 @@ class EpubProvider(PdfProvider):
             config: Конфигурация провайдера (опционально)
         """
         # Создаем временный PDF файл для промежуточного хранения
-        temp_pdf = tempfile.NamedTemporaryFile(delete=False, suffix=f".pdf")
-        self.temp_pdf_path = temp_pdf.name
-        temp_pdf.close()
+        # PdfProvider (и pdftext) читают документ по пути, поэтому без файла не обойтись,
+        # но по возможности он создается в tmpfs, минуя диск.
+        # Файл удаляется автоматически при уничтожении провайдера
+        self.temp_pdf_path = create_temp_pdf(self)
 
         # Конвертируем EPUB в PDF
         try:
@@ -93,15 +93,6 @@ class EpubProvider(PdfProvider):
         # Инициализируем родительский PdfProvider с временным PDF файлом
         super().__init__(self.temp_pdf_path, config)
 
-    def __del__(self):
-        """
-        Деструктор для очистки временных файлов.
-        
-        Удаляет временный PDF файл при уничтожении объекта.
-        """
-        if os.path.exists(self.temp_pdf_path):
-            os.remove(self.temp_pdf_path)
-
     def convert_epub_to_pdf(self, filepath):
         """
         Конвертирует EPUB книгу в PDF формат.
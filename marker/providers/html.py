@@ -8,10 +8,33 @@
 Автор: Marker Team
 """
 
+import hashlib
+import importlib.metadata
 import os
-import tempfile
+import sys
+from typing import TYPE_CHECKING, ClassVar, Optional
 
 from marker.providers.pdf import PdfProvider
+from marker.providers.utils import create_temp_pdf, release_temp_file, remove_file
+from marker.settings import settings
+
+if TYPE_CHECKING:
+    from weasyprint import CSS
+
+
+def __getattr__(name: str):
+    """
+    Ленивый импорт weasyprint (PEP 562).
+
+    weasyprint тянет за собой тяжелые нативные зависимости (cairo, pango), поэтому
+    импортируется только при первом обращении к HTML и затем кэшируется в модуле.
+    """
+    if name == "HTML":
+        global HTML
+        from weasyprint import HTML
+
+        return HTML
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class HTMLProvider(PdfProvider):
@@ -26,6 +49,9 @@ class HTMLProvider(PdfProvider):
     2. Конвертация HTML в PDF с помощью weasyprint
     3. Инициализация родительского PdfProvider с временным PDF
     """
+    # Скомпилированный weasyprint.CSS со шрифтами, общий для всех экземпляров
+    _font_css_cache: ClassVar[Optional["CSS"]] = None
+
     def __init__(self, filepath: str, config=None):
         """
         Инициализация провайдера HTML.
@@ -34,29 +60,139 @@ class HTMLProvider(PdfProvider):
             filepath (str): Путь к HTML файлу
             config: Конфигурация провайдера (опционально)
         """
+        # Если этот HTML уже конвертировался ранее, берем PDF из кэша
+        cache_path = self.get_pdf_cache_path(filepath)
+        if cache_path is not None and os.path.exists(cache_path):
+            # Обновляем время записи: вытеснение из кэша удаляет самые старые файлы
+            try:
+                os.utime(cache_path)
+            except OSError:
+                pass
+            self.temp_pdf_path = cache_path
+            super().__init__(self.temp_pdf_path, config)
+            return
+
         # Создаем временный PDF файл для промежуточного хранения
-        temp_pdf = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-        self.temp_pdf_path = temp_pdf.name
-        temp_pdf.close()
+        # (в директории кэша, чтобы затем атомарно переместить его на место)
+        self.temp_pdf_path = create_temp_pdf(
+            self, dir=os.path.dirname(cache_path) if cache_path else None
+        )
 
         # Конвертируем HTML в PDF
         try:
             self.convert_html_to_pdf(filepath)
         except Exception as e:
             # В случае ошибки конвертации удаляем временный файл и выбрасываем исключение
+            release_temp_file(self.temp_pdf_path)
             raise RuntimeError(f"Failed to convert {filepath} to PDF: {e}")
 
+        # Сохраняем результат в кэш; теперь файлом владеет кэш, а не провайдер
+        if cache_path is not None:
+            os.replace(self.temp_pdf_path, cache_path)
+            release_temp_file(self.temp_pdf_path, delete=False)
+            self.temp_pdf_path = cache_path
+            self.prune_pdf_cache(keep_path=cache_path)
+
         # Инициализируем родительский PdfProvider с временным PDF файлом
         super().__init__(self.temp_pdf_path, config)
 
-    def __del__(self):
+    def close(self):
         """
-        Деструктор для очистки временных файлов.
-        
-        Удаляет временный PDF файл при уничтожении объекта.
+        Удаляет временный PDF файл (закэшированные PDF не удаляются).
+        Повторный вызов безопасен.
+        """
+        # Сначала закрываем PDF документ, затем удаляем его файл
+        super().close()
+        temp_pdf_path = getattr(self, "temp_pdf_path", None)
+        if temp_pdf_path is not None:
+            release_temp_file(temp_pdf_path)
+
+    @staticmethod
+    def get_pdf_cache_path(filepath: str) -> Optional[str]:
+        """
+        Возвращает путь к закэшированному PDF для HTML файла.
+
+        Ключ кэша - blake2b хэш содержимого файла, абсолютного пути к его
+        директории (относительные ссылки на изображения и CSS разрешаются от нее),
+        версии WeasyPrint и имени шрифта, поэтому измененный файл, тот же файл
+        в другой папке или обновление WeasyPrint получают новую запись.
+
+        Args:
+            filepath (str): Путь к HTML файлу
+
+        Returns:
+            Optional[str]: Путь к PDF в кэше или None, если кэш отключен/недоступен
+        """
+        if not settings.HTML_PDF_CACHE_DIR:
+            return None
+
+        try:
+            weasyprint_version = importlib.metadata.version("weasyprint")
+        except importlib.metadata.PackageNotFoundError:
+            return None
+
+        try:
+            os.makedirs(settings.HTML_PDF_CACHE_DIR, exist_ok=True)
+            digest = hashlib.blake2b(digest_size=20)
+            for key_part in (
+                settings.FONT_NAME,
+                weasyprint_version,
+                os.path.dirname(os.path.realpath(filepath)),
+            ):
+                digest.update(key_part.encode("utf-8"))
+                digest.update(b"\0")
+            with open(filepath, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+        except OSError:
+            return None
+
+        return os.path.join(settings.HTML_PDF_CACHE_DIR, f"{digest.hexdigest()}.pdf")
+
+    @staticmethod
+    def prune_pdf_cache(keep_path: Optional[str] = None):
         """
-        if os.path.exists(self.temp_pdf_path):
-            os.remove(self.temp_pdf_path)
+        Удаляет самые старые PDF из кэша, пока его размер больше
+        HTML_PDF_CACHE_MAX_MB. Время записи обновляется при каждом попадании
+        в кэш, поэтому удаляются давно не использовавшиеся файлы.
+
+        Args:
+            keep_path (Optional[str]): Файл, который нельзя удалять (только что записанный)
+        """
+        max_bytes = settings.HTML_PDF_CACHE_MAX_MB * 1024 * 1024
+        entries = []
+        total_size = 0
+        try:
+            with os.scandir(settings.HTML_PDF_CACHE_DIR) as it:
+                for entry in it:
+                    if not entry.name.endswith(".pdf") or not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total_size += stat.st_size
+        except OSError:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= max_bytes:
+                break
+            if path == keep_path:
+                continue
+            remove_file(path)
+            total_size -= size
+
+    @classmethod
+    def get_cached_font_css(cls):
+        """
+        Возвращает CSS шрифтов, разобранный один раз на все экземпляры провайдера.
+
+        Returns:
+            CSS: Объект CSS для библиотеки WeasyPrint
+        """
+        if HTMLProvider._font_css_cache is None:
+            HTMLProvider._font_css_cache = cls.get_font_css()
+        return HTMLProvider._font_css_cache
 
     def convert_html_to_pdf(self, filepath: str):
         """
@@ -67,10 +203,11 @@ class HTMLProvider(PdfProvider):
         Args:
             filepath (str): Путь к исходному HTML файлу
         """
-        from weasyprint import HTML
+        # Атрибут модуля: при первом обращении срабатывает ленивый импорт в __getattr__
+        HTML = getattr(sys.modules[__name__], "HTML")
 
         # Получаем CSS стили для корректного отображения шрифтов
-        font_css = self.get_font_css()
+        font_css = self.get_cached_font_css()
         # Конвертируем HTML в PDF с применением стилей шрифтов
         HTML(filename=filepath, encoding="utf-8").write_pdf(
             self.temp_pdf_path, stylesheets=[font_css]
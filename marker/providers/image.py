@@ -8,7 +8,7 @@
 Автор: Marker Team
 """
 
-from typing import List, Annotated
+from typing import List, Annotated, Optional
 from PIL import Image
 
 from marker.providers import ProviderPageLines, BaseProvider
@@ -50,8 +50,11 @@ class ImageProvider(BaseProvider):
         # Вызываем конструктор родительского класса
         super().__init__(filepath, config)
 
-        # Открываем и сохраняем изображение
-        self.images = [Image.open(filepath)]
+        # Читаем только заголовок файла, чтобы узнать размеры изображения.
+        # Пиксели декодируются лениво, при первом вызове get_images
+        with Image.open(filepath) as image:
+            self._image_sizes = [image.size]
+        self._images: List[Optional[Image.Image]] = [None] * self.image_count
         # Инициализируем словарь для хранения строк страниц
         self.page_lines: ProviderPageLines = {i: [] for i in range(self.image_count)}
 
@@ -67,10 +70,36 @@ class ImageProvider(BaseProvider):
         # Создаем ограничивающие прямоугольники для каждой страницы
         # Используем размеры изображения как границы страницы
         self.page_bboxes = {
-            i: [0, 0, self.images[i].size[0], self.images[i].size[1]]
+            i: [0, 0, self._image_sizes[i][0], self._image_sizes[i][1]]
             for i in self.page_range
         }
 
+    @property
+    def images(self) -> List[Image.Image]:
+        """
+        Декодированные изображения всех страниц (загружаются при первом обращении).
+
+        Returns:
+            List[Image.Image]: Список изображений PIL
+        """
+        return [self._load_image(i) for i in range(self.image_count)]
+
+    def _load_image(self, idx: int) -> Image.Image:
+        """
+        Декодирует изображение страницы один раз и кэширует результат.
+
+        Args:
+            idx (int): Индекс страницы
+
+        Returns:
+            Image.Image: Декодированное изображение PIL
+        """
+        if self._images[idx] is None:
+            image = Image.open(self.filepath)
+            image.load()
+            self._images[idx] = image
+        return self._images[idx]
+
     def __len__(self):
         """
         Возвращает количество страниц в изображении.
@@ -91,7 +120,7 @@ class ImageProvider(BaseProvider):
         Returns:
             List[Image.Image]: Список изображений PIL
         """
-        return [self.images[i] for i in idxs]
+        return [self._load_image(i) for i in idxs]
 
     def get_page_bbox(self, idx: int) -> PolygonBox | None:
         """
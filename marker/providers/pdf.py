@@ -11,7 +11,11 @@ pypdfium2 для низкоуровневой работы с PDF и pdftext д
 import contextlib
 import ctypes
 import logging
+import os
 import re
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Annotated, Dict, List, Optional, Set
 
 import pypdfium2 as pdfium
@@ -19,7 +23,6 @@ import pypdfium2.raw as pdfium_c
 from ftfy import fix_text
 from pdftext.extraction import dictionary_output
 from pdftext.schema import Reference
-from pdftext.pdf.utils import flatten as flatten_pdf_page
 
 from PIL import Image
 from pypdfium2 import PdfiumError, PdfDocument
@@ -35,6 +38,133 @@ from marker.schema.text.span import Span
 # Игнорируем предупреждения pypdfium2 о выравнивании форм
 logging.getLogger("pypdfium2").setLevel(logging.ERROR)
 
+# Таблица замены нестандартных пробелов на обычный пробел (один проход str.translate)
+SPACE_TRANSLATION = str.maketrans(
+    {
+        "\u2003": " ",  # em space
+        "\u2002": " ",  # en space
+        "\u00a0": " ",  # non-breaking space
+        "\u200b": " ",  # zero-width space
+        "\u3000": " ",  # ideographic space
+    }
+)
+
+# Серии пробельных символов и переносов строк для оценки качества текста
+WHITESPACE_RE = re.compile(r"\s+")
+NEWLINE_RE = re.compile(r"\n+")
+
+# Биты флагов шрифта PDF (позиция бита, начиная с 1) и их названия
+FONT_FLAG_MAP = {
+    1: "FixedPitch",
+    2: "Serif",
+    3: "Symbolic",
+    4: "Script",
+    6: "Nonsymbolic",
+    7: "Italic",
+    17: "AllCap",
+    18: "SmallCap",
+    19: "ForceBold",
+    20: "UseExternAttr",
+}
+# Маска всех значимых битов флагов шрифта
+FONT_FLAG_MASK = sum(1 << (bit_position - 1) for bit_position in FONT_FLAG_MAP)
+
+
+def _compute_font_flags_format(flags: int) -> frozenset:
+    set_flags = set()
+    for bit_position, flag_name in FONT_FLAG_MAP.items():
+        if flags & (1 << (bit_position - 1)):
+            set_flags.add(flag_name)
+    if not set_flags:
+        set_flags.add("Plain")
+
+    formats = set()
+    if set_flags == {"Symbolic", "Italic"} or set_flags == {
+        "Symbolic",
+        "Italic",
+        "UseExternAttr",
+    }:
+        formats.add("plain")
+    elif set_flags == {"UseExternAttr"}:
+        formats.add("plain")
+    elif set_flags == {"Plain"}:
+        formats.add("plain")
+    else:
+        if set_flags & {"Italic"}:
+            formats.add("italic")
+        if set_flags & {"ForceBold"}:
+            formats.add("bold")
+        if set_flags & {
+            "FixedPitch",
+            "Serif",
+            "Script",
+            "Nonsymbolic",
+            "AllCap",
+            "SmallCap",
+            "UseExternAttr",
+        }:
+            formats.add("plain")
+    return frozenset(formats)
+
+
+def _build_font_flags_table() -> Dict[int, frozenset]:
+    # Значимых битов всего 10, поэтому заранее вычисляем форматы для всех 2^10 комбинаций
+    bit_masks = [1 << (bit_position - 1) for bit_position in FONT_FLAG_MAP]
+    table = {}
+    for combo in range(1 << len(bit_masks)):
+        flags = 0
+        for i, mask in enumerate(bit_masks):
+            if combo & (1 << i):
+                flags |= mask
+        table[flags] = _compute_font_flags_format(flags)
+    return table
+
+
+# Таблица {значимые биты флагов: форматы шрифта}
+FONT_FLAGS_TABLE = _build_font_flags_table()
+PLAIN_FORMAT = frozenset({"plain"})
+
+
+def fix_span_texts(texts: List[str]) -> List[str]:
+    # ftfy has a noticeable fixed cost per call, so all spans of a line are fixed in one call.
+    # fix_text processes newline-separated segments independently, which keeps the result
+    # identical to per-span calls, as long as no span contains a newline itself, and no
+    # span contains "<" (that switches ftfy's "auto" HTML unescaping for later segments)
+    if len(texts) <= 1 or any("\n" in text or "<" in text for text in texts):
+        return [fix_text(text) for text in texts]
+
+    fixed = fix_text("\n".join(texts)).split("\n")
+    if len(fixed) != len(texts):
+        # A fix introduced or removed line breaks, fall back to per-span fixing
+        return [fix_text(text) for text in texts]
+    return fixed
+
+
+def bbox_intersection_pct(bbox, other_bbox) -> float:
+    # Same result as PolygonBox.intersection_pct, computed on plain floats
+    x0, x1 = min(bbox[0], bbox[2]), max(bbox[0], bbox[2])
+    y0, y1 = min(bbox[1], bbox[3]), max(bbox[1], bbox[3])
+    area = (x1 - x0) * (y1 - y0)
+    if area == 0:
+        return 0
+
+    ox0, ox1 = min(other_bbox[0], other_bbox[2]), max(other_bbox[0], other_bbox[2])
+    oy0, oy1 = min(other_bbox[1], other_bbox[3]), max(other_bbox[1], other_bbox[3])
+    overlap_x = max(0, min(x1, ox1) - max(x0, ox0))
+    overlap_y = max(0, min(y1, oy1) - max(y0, oy0))
+    return overlap_x * overlap_y / area
+
+
+@lru_cache(maxsize=4096)
+def _font_name_formats(font_name: str) -> frozenset:
+    formats = set()
+    lowered = font_name.lower()
+    if "bold" in lowered:
+        formats.add("bold")
+    if "ital" in lowered:
+        formats.add("italic")
+    return frozenset(formats)
+
 
 class PdfProvider(BaseProvider):
     """
@@ -62,7 +192,8 @@ class PdfProvider(BaseProvider):
     pdftext_workers: Annotated[
         int,
         "Количество воркеров для pdftext.",
-    ] = 4
+        "По умолчанию 4, но не больше числа доступных CPU.",
+    ] = min(4, os.cpu_count() or 1)
     # Выравнивать ли структуру PDF для упрощения обработки
     flatten_pdf: Annotated[
         bool,
@@ -118,6 +249,9 @@ class PdfProvider(BaseProvider):
         super().__init__(filepath, config)
 
         self.filepath = filepath
+        # The document is opened once and shared by text extraction, page checks
+        # and rendering, instead of re-parsing the xref table on every access
+        self._doc: Optional[PdfDocument] = None
 
         with self.get_doc() as doc:
             self.page_count = len(doc)
@@ -141,96 +275,43 @@ class PdfProvider(BaseProvider):
 
     @contextlib.contextmanager
     def get_doc(self):
-        doc = None
-        try:
+        if getattr(self, "_doc", None) is None:
             doc = pdfium.PdfDocument(self.filepath)
 
             # Must be called on the parent pdf, before retrieving pages to render correctly
             if self.flatten_pdf:
                 doc.init_forms()
 
-            yield doc
-        finally:
-            if doc:
-                doc.close()
+            self._doc = doc
+            # Callers that never call close() still release the pdfium handle
+            # once the provider is garbage collected
+            self._doc_finalizer = weakref.finalize(self, doc.close)
+        yield self._doc
+
+    def close(self):
+        if getattr(self, "_doc", None) is not None:
+            self._doc = None
+            self._doc_finalizer()
 
     def __len__(self) -> int:
         return self.page_count
 
-    def font_flags_to_format(self, flags: Optional[int]) -> Set[str]:
+    @staticmethod
+    def font_flags_to_format(flags: Optional[int]) -> Set[str]:
         if flags is None:
-            return {"plain"}
-
-        flag_map = {
-            1: "FixedPitch",
-            2: "Serif",
-            3: "Symbolic",
-            4: "Script",
-            6: "Nonsymbolic",
-            7: "Italic",
-            17: "AllCap",
-            18: "SmallCap",
-            19: "ForceBold",
-            20: "UseExternAttr",
-        }
-        set_flags = set()
-        for bit_position, flag_name in flag_map.items():
-            if flags & (1 << (bit_position - 1)):
-                set_flags.add(flag_name)
-        if not set_flags:
-            set_flags.add("Plain")
-
-        formats = set()
-        if set_flags == {"Symbolic", "Italic"} or set_flags == {
-            "Symbolic",
-            "Italic",
-            "UseExternAttr",
-        }:
-            formats.add("plain")
-        elif set_flags == {"UseExternAttr"}:
-            formats.add("plain")
-        elif set_flags == {"Plain"}:
-            formats.add("plain")
-        else:
-            if set_flags & {"Italic"}:
-                formats.add("italic")
-            if set_flags & {"ForceBold"}:
-                formats.add("bold")
-            if set_flags & {
-                "FixedPitch",
-                "Serif",
-                "Script",
-                "Nonsymbolic",
-                "AllCap",
-                "SmallCap",
-                "UseExternAttr",
-            }:
-                formats.add("plain")
-        return formats
-
-    def font_names_to_format(self, font_name: str | None) -> Set[str]:
-        formats = set()
-        if font_name is None:
-            return formats
+            return PLAIN_FORMAT
+        return FONT_FLAGS_TABLE[flags & FONT_FLAG_MASK]
 
-        if "bold" in font_name.lower():
-            formats.add("bold")
-        if "ital" in font_name.lower():
-            formats.add("italic")
-        return formats
+    @staticmethod
+    def font_names_to_format(font_name: str | None) -> Set[str]:
+        if font_name is None:
+            return frozenset()
+        # Имена шрифтов сильно повторяются в пределах документа
+        return _font_name_formats(font_name)
 
     @staticmethod
     def normalize_spaces(text):
-        space_chars = [
-            "\u2003",  # em space
-            "\u2002",  # en space
-            "\u00a0",  # non-breaking space
-            "\u200b",  # zero-width space
-            "\u3000",  # ideographic space
-        ]
-        for space in space_chars:
-            text = text.replace(space, " ")
-        return text
+        return text.translate(SPACE_TRANSLATION)
 
     def pdftext_extraction(self, doc: PdfDocument) -> ProviderPageLines:
         page_lines: ProviderPageLines = {}
@@ -252,31 +333,46 @@ class PdfProvider(BaseProvider):
         LineClass: Line = get_block_class(BlockTypes.Line)
         CharClass: Char = get_block_class(BlockTypes.Char)
 
+        # Local binds for the hot span loop (local lookups are cheaper than globals/attributes)
+        from_bbox_nz = PolygonBox.from_bbox_nz
+        from_bbox_array = PolygonBox.from_bbox_array
+        flags_to_format = self.font_flags_to_format
+        names_to_format = self.font_names_to_format
+        normalize_spaces = self.normalize_spaces
+        keep_chars = self.keep_chars
+
         for page in page_char_blocks:
             page_id = page["page"]
             lines: List[ProviderOutput] = []
-            if not self.check_page(page_id, doc):
+            # Text presence is already known from pdftext's output: a page without spans
+            # yields no lines and is rejected by check_line_spans. The pdfium object walk
+            # is only needed for the font/render-mode checks of strip_existing_ocr
+            if self.strip_existing_ocr and not self.check_page(page_id, doc):
                 continue
 
             for block in page["blocks"]:
                 for line in block["lines"]:
                     spans: List[Span] = []
                     chars: List[List[Char]] = []
-                    for span in line["spans"]:
-                        if not span["text"]:
-                            continue
-                        font_formats = self.font_flags_to_format(
-                            span["font"]["flags"]
-                        ).union(self.font_names_to_format(span["font"]["name"]))
-                        font_name = span["font"]["name"] or "Unknown"
-                        font_weight = span["font"]["weight"] or 0
-                        font_size = span["font"]["size"] or 0
-                        polygon = PolygonBox.from_bbox(
-                            span["bbox"], ensure_nonzero_area=True
+                    line_spans = [span for span in line["spans"] if span["text"]]
+                    span_polygons = from_bbox_array(
+                        [span["bbox"] for span in line_spans], ensure_nonzero_area=True
+                    )
+                    span_texts = fix_span_texts([span["text"] for span in line_spans])
+                    for span, polygon, span_text in zip(
+                        line_spans, span_polygons, span_texts
+                    ):
+                        font = span["font"]
+                        font_name = font["name"]
+                        font_formats = flags_to_format(font["flags"]).union(
+                            names_to_format(font_name)
                         )
+                        font_name = font_name or "Unknown"
+                        font_weight = font["weight"] or 0
+                        font_size = font["size"] or 0
                         superscript = span.get("superscript", False)
                         subscript = span.get("subscript", False)
-                        text = self.normalize_spaces(fix_text(span["text"]))
+                        text = normalize_spaces(span_text)
                         if superscript or subscript:
                             text = text.strip()
 
@@ -298,24 +394,24 @@ class PdfProvider(BaseProvider):
                             )
                         )
 
-                        if self.keep_chars:
+                        if keep_chars:
+                            char_polygons = from_bbox_array(
+                                [c["bbox"] for c in span["chars"]],
+                                ensure_nonzero_area=True,
+                            )
                             span_chars = [
                                 CharClass(
                                     text=c["char"],
-                                    polygon=PolygonBox.from_bbox(
-                                        c["bbox"], ensure_nonzero_area=True
-                                    ),
+                                    polygon=char_polygon,
                                     idx=c["char_idx"],
                                 )
-                                for c in span["chars"]
+                                for c, char_polygon in zip(span["chars"], char_polygons)
                             ]
                             chars.append(span_chars)
                         else:
                             chars.append([])
 
-                    polygon = PolygonBox.from_bbox(
-                        line["bbox"], ensure_nonzero_area=True
-                    )
+                    polygon = from_bbox_nz(line["bbox"])
 
                     assert len(spans) == len(chars), (
                         f"Spans and chars length mismatch on page {page_id}: {len(spans)} spans, {len(chars)} chars"
@@ -341,10 +437,8 @@ class PdfProvider(BaseProvider):
         if len(page_spans) == 0:
             return False
 
-        text = ""
-        for span in page_spans:
-            text = text + " " + span.text
-            text = text + "\n"
+        # Собираем текст одним join вместо квадратичной конкатенации
+        text = "".join([f" {span.text}\n" for span in page_spans])
         if len(text.strip()) == 0:
             return False
         if self.detect_bad_ocr(text):
@@ -353,7 +447,25 @@ class PdfProvider(BaseProvider):
 
     def check_page(self, page_id: int, doc: PdfDocument) -> bool:
         page = doc.get_page(page_id)
-        page_bbox = PolygonBox.from_bbox(page.get_bbox())
+
+        # Cheap text-presence test: count chars without walking the page objects
+        try:
+            textpage = page.get_textpage()
+            try:
+                char_count = textpage.count_chars()
+            finally:
+                textpage.close()
+        except PdfiumError:
+            return False
+
+        # if we do not see any text in the pdf, we can skip this page
+        if char_count <= 0:
+            return False
+
+        # The object walk is only needed for the existing-OCR checks
+        if not self.strip_existing_ocr:
+            return True
+
         try:
             page_objs = list(
                 page.get_objects(
@@ -364,47 +476,54 @@ class PdfProvider(BaseProvider):
             # Happens when pdfium fails to get the number of page objects
             return False
 
+        # Bucket objects by type once instead of re-filtering the list for every check
+        text_objs = [obj for obj in page_objs if obj.type == pdfium_c.FPDF_PAGEOBJ_TEXT]
+        img_objs = [obj for obj in page_objs if obj.type == pdfium_c.FPDF_PAGEOBJ_IMAGE]
+
         # if we do not see any text objects in the pdf, we can skip this page
-        if not any([obj.type == pdfium_c.FPDF_PAGEOBJ_TEXT for obj in page_objs]):
+        if not text_objs:
             return False
 
-        if self.strip_existing_ocr:
-            # If any text objects on the page are in invisible render mode, skip this page
-            for text_obj in filter(
-                lambda obj: obj.type == pdfium_c.FPDF_PAGEOBJ_TEXT, page_objs
-            ):
-                if pdfium_c.FPDFTextObj_GetTextRenderMode(text_obj) in [
-                    pdfium_c.FPDF_TEXTRENDERMODE_INVISIBLE,
-                    pdfium_c.FPDF_TEXTRENDERMODE_UNKNOWN,
-                ]:
-                    return False
+        # If any text objects on the page are in invisible render mode, skip this page
+        for text_obj in text_objs:
+            if pdfium_c.FPDFTextObj_GetTextRenderMode(text_obj) in [
+                pdfium_c.FPDF_TEXTRENDERMODE_INVISIBLE,
+                pdfium_c.FPDF_TEXTRENDERMODE_UNKNOWN,
+            ]:
+                return False
 
-            non_embedded_fonts = []
-            empty_fonts = []
-            font_map = {}
-            for text_obj in filter(
-                lambda obj: obj.type == pdfium_c.FPDF_PAGEOBJ_TEXT, page_objs
-            ):
-                font = pdfium_c.FPDFTextObj_GetFont(text_obj)
+        non_embedded_fonts = []
+        empty_fonts = []
+        font_map = {}
+        # Font handles repeat heavily within a page, so names are looked up once per handle
+        font_names: Dict[int, str] = {}
+        for text_obj in text_objs:
+            font = pdfium_c.FPDFTextObj_GetFont(text_obj)
+            font_key = ctypes.cast(font, ctypes.c_void_p).value
+            font_name = font_names.get(font_key)
+            if font_name is None:
                 font_name = self._get_fontname(font)
+                font_names[font_key] = font_name
 
-                # we also skip pages without embedded fonts and fonts without names
-                non_embedded_fonts.append(pdfium_c.FPDFFont_GetIsEmbedded(font) == 0)
-                empty_fonts.append(
-                    "glyphless" in font_name.lower()
-                )  # Add font name check back in when we bump pypdfium2
-                if font_name not in font_map:
-                    font_map[font_name or "Unknown"] = font
+            # we also skip pages without embedded fonts and fonts without names
+            non_embedded_fonts.append(pdfium_c.FPDFFont_GetIsEmbedded(font) == 0)
+            empty_fonts.append(
+                "glyphless" in font_name.lower()
+            )  # Add font name check back in when we bump pypdfium2
+            if font_name not in font_map:
+                font_map[font_name or "Unknown"] = font
 
-            if all(non_embedded_fonts) or all(empty_fonts):
-                return False
+        if all(non_embedded_fonts) or all(empty_fonts):
+            return False
 
-            # if we see very large images covering most of the page, we can skip this page
-            for img_obj in filter(
-                lambda obj: obj.type == pdfium_c.FPDF_PAGEOBJ_IMAGE, page_objs
-            ):
-                img_bbox = PolygonBox.from_bbox(img_obj.get_pos())
-                if page_bbox.intersection_pct(img_bbox) >= self.image_threshold:
+        # if we see very large images covering most of the page, we can skip this page
+        if img_objs:
+            page_bbox = page.get_bbox()
+            for img_obj in img_objs:
+                if (
+                    bbox_intersection_pct(page_bbox, img_obj.get_pos())
+                    >= self.image_threshold
+                ):
                     return False
 
         return True
@@ -414,42 +533,73 @@ class PdfProvider(BaseProvider):
             # Assume OCR failed if we have no text
             return True
 
-        spaces = len(re.findall(r"\s+", text))
-        alpha_chars = len(re.sub(r"\s+", "", text))
+        # Один проход regex дает и число пробельных серий, и их суммарную длину
+        whitespace_runs = WHITESPACE_RE.findall(text)
+        spaces = len(whitespace_runs)
+        alpha_chars = len(text) - sum(map(len, whitespace_runs))
         if spaces / (alpha_chars + spaces) > self.ocr_space_threshold:
             return True
 
-        newlines = len(re.findall(r"\n+", text))
-        non_newlines = len(re.sub(r"\n+", "", text))
+        newlines = len(NEWLINE_RE.findall(text))
+        non_newlines = len(text) - text.count("\n")
         if newlines / (newlines + non_newlines) > self.ocr_newline_threshold:
             return True
 
         if alphanum_ratio(text) < self.ocr_alphanum_threshold:  # Garbled text
             return True
 
-        invalid_chars = len([c for c in text if c in self.ocr_invalid_chars])
+        invalid_chars = sum(text.count(c) for c in set(self.ocr_invalid_chars))
         if invalid_chars > max(6.0, len(text) * 0.03):
             return True
 
         return False
 
     @staticmethod
-    def _render_image(
+    def _render_bitmap(
         pdf: pdfium.PdfDocument, idx: int, dpi: int, flatten_page: bool
-    ) -> Image.Image:
+    ) -> pdfium.PdfBitmap:
         page = pdf[idx]
         if flatten_page:
-            flatten_pdf_page(page)
-            page = pdf[idx]
-        image = page.render(scale=dpi / 72, draw_annots=False).to_pil()
+            rc = pdfium_c.FPDFPage_Flatten(page, pdfium_c.FLAT_NORMALDISPLAY)
+            if rc == pdfium_c.FLATTEN_FAIL:
+                raise PdfiumError("Failed to flatten annotations / form fields.")
+            # The page handle only has to be reloaded if something was actually flattened
+            if rc == pdfium_c.FLATTEN_SUCCESS:
+                page = pdf[idx]
+        return page.render(scale=dpi / 72, draw_annots=False)
+
+    @staticmethod
+    def _bitmap_to_image(bitmap: pdfium.PdfBitmap) -> Image.Image:
+        image = bitmap.to_pil()
         image = image.convert("RGB")
         return image
 
+    @staticmethod
+    def _render_image(
+        pdf: pdfium.PdfDocument, idx: int, dpi: int, flatten_page: bool
+    ) -> Image.Image:
+        bitmap = PdfProvider._render_bitmap(pdf, idx, dpi, flatten_page)
+        return PdfProvider._bitmap_to_image(bitmap)
+
     def get_images(self, idxs: List[int], dpi: int) -> List[Image.Image]:
         with self.get_doc() as doc:
-            images = [
-                self._render_image(doc, idx, dpi, self.flatten_pdf) for idx in idxs
-            ]
+            if len(idxs) <= 1:
+                return [
+                    self._render_image(doc, idx, dpi, self.flatten_pdf) for idx in idxs
+                ]
+
+            # pdfium is not thread-safe, so rasterization stays on this thread, while
+            # the PIL conversion of already rendered pages overlaps with it in a pool
+            max_workers = min(len(idxs), os.cpu_count() or 1)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    executor.submit(
+                        self._bitmap_to_image,
+                        self._render_bitmap(doc, idx, dpi, self.flatten_pdf),
+                    )
+                    for idx in idxs
+                ]
+                images = [future.result() for future in futures]
         return images
 
     def get_page_bbox(self, idx: int) -> PolygonBox | None:
@@ -466,16 +616,11 @@ class PdfProvider(BaseProvider):
     @staticmethod
     def _get_fontname(font) -> str:
         font_name = ""
-        buffer_size = 256
 
         try:
-            font_name_buffer = ctypes.create_string_buffer(buffer_size)
-            length = pdfium_c.FPDFFont_GetBaseFontName(
-                font, font_name_buffer, buffer_size
-            )
-            if length < buffer_size:
-                font_name = font_name_buffer.value.decode("utf-8")
-            else:
+            # Query the required length first, then fill an exactly sized buffer once
+            length = pdfium_c.FPDFFont_GetBaseFontName(font, None, 0)
+            if length > 0:
                 font_name_buffer = ctypes.create_string_buffer(length)
                 pdfium_c.FPDFFont_GetBaseFontName(font, font_name_buffer, length)
                 font_name = font_name_buffer.value.decode("utf-8")
@@ -11,11 +11,41 @@
 
 import base64
 import os
+import pathlib
 import tempfile
 import traceback
+from typing import Annotated
+
+from lxml import etree
 
 from marker.logger import get_logger
 from marker.providers.pdf import PdfProvider
+from marker.providers.utils import (
+    create_temp_pdf,
+    get_temp_dir,
+    HTML_ESCAPE_TABLE,
+    remove_file,
+    write_temp_html,
+)
+
+try:
+    # Перечисления python-pptx импортируются один раз; члены привязываются к
+    # модульным константам, чтобы в циклах по фигурам сравнивать их по identity
+    from pptx.enum.shapes import MSO_SHAPE_TYPE, PP_PLACEHOLDER
+
+    _GROUP = MSO_SHAPE_TYPE.GROUP
+    _PICTURE = MSO_SHAPE_TYPE.PICTURE
+    _TITLE_PLACEHOLDERS = (PP_PLACEHOLDER.TITLE, PP_PLACEHOLDER.CENTER_TITLE)
+    _SUBTITLE = PP_PLACEHOLDER.SUBTITLE
+except ImportError:
+    # python-pptx входит в опциональные зависимости
+    _GROUP = _PICTURE = _SUBTITLE = None
+    _TITLE_PLACEHOLDERS = ()
+
+# Пространство имен DrawingML и предкомпилированные XPath выражения для маркеров списков
+_A_NS = {"a": "http://schemas.openxmlformats.org/drawingml/2006/main"}
+_BU_NUM = etree.XPath(".//a:buAutoNum", namespaces=_A_NS)
+_HAS_BULLET = etree.XPath("boolean(.//a:buChar|.//a:buAutoNum)", namespaces=_A_NS)
 
 # Инициализируем логгер для записи ошибок и отладочной информации
 logger = get_logger()
@@ -71,6 +101,11 @@ class PowerPointProvider(PdfProvider):
     """
     # Флаг для включения номеров слайдов в HTML вывод
     include_slide_number: bool = False
+    flatten_pdf: Annotated[
+        bool,
+        "Выравнивать ли структуру PDF.",
+        "Промежуточный PDF генерируется WeasyPrint без форм и аннотаций, поэтому по умолчанию не выравнивается.",
+    ] = False
 
     def __init__(self, filepath: str, config=None):
         """
@@ -80,10 +115,22 @@ class PowerPointProvider(PdfProvider):
             filepath (str): Путь к PPTX файлу
             config: Конфигурация провайдера (опционально)
         """
-        # Создаем временный PDF файл для промежуточного хранения
-        temp_pdf = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-        self.temp_pdf_path = temp_pdf.name
-        temp_pdf.close()
+        # Директория для файлов изображений, существующая только во время конвертации
+        self._img_dir = None
+        # Кэш файлов изображений: имя части пакета PPTX -> путь к файлу
+        self._img_files = {}
+
+        # Обработчики фигур, выбираемые по типу фигуры
+        self._shape_handlers = {}
+        if _GROUP is not None:
+            self._shape_handlers = {
+                _GROUP: self._handle_group,
+                _PICTURE: self._handle_image,
+            }
+
+        # Создаем временный PDF файл для промежуточного хранения (по возможности в tmpfs).
+        # Файл удаляется автоматически при уничтожении провайдера
+        self.temp_pdf_path = create_temp_pdf(self)
 
         # Конвертируем PPTX в PDF
         try:
@@ -96,15 +143,6 @@ class PowerPointProvider(PdfProvider):
         # Инициализируем родительский PdfProvider с временным PDF файлом
         super().__init__(self.temp_pdf_path, config)
 
-    def __del__(self):
-        """
-        Деструктор для очистки временных файлов.
-        
-        Удаляет временный PDF файл при уничтожении объекта.
-        """
-        if os.path.exists(self.temp_pdf_path):
-            os.remove(self.temp_pdf_path)
-
     def convert_pptx_to_pdf(self, filepath):
         """
         Конвертирует презентацию PPTX в PDF формат.
@@ -121,98 +159,115 @@ class PowerPointProvider(PdfProvider):
         """
         from weasyprint import CSS, HTML
         from pptx import Presentation
-        from pptx.enum.shapes import MSO_SHAPE_TYPE
 
         # Загружаем презентацию
         pptx = Presentation(filepath)
 
-        # Список для хранения частей HTML
-        html_parts = []
-
-        # Обрабатываем каждый слайд
-        for slide_index, slide in enumerate(pptx.slides):
-            # Начинаем новую секцию для слайда
-            html_parts.append("<section>")
-            # Добавляем заголовок слайда, если включена нумерация
-            if self.include_slide_number:
-                html_parts.append(f"<h2>Slide {slide_index + 1}</h2>")
-
-            # Обрабатываем фигуры на слайде
-            for shape in slide.shapes:
-                # Если фигура является группой, обрабатываем рекурсивно
-                if shape.shape_type == MSO_SHAPE_TYPE.GROUP:
-                    html_parts.append(self._handle_group(shape))
-                    continue
-
-                # Если фигура содержит таблицу
-                if shape.has_table:
-                    html_parts.append(self._handle_table(shape))
-                    continue
-
-                # Если фигура является изображением
-                if shape.shape_type == MSO_SHAPE_TYPE.PICTURE:
-                    html_parts.append(self._handle_image(shape))
-                    continue
-
-                # Если фигура содержит текст
-                if hasattr(shape, "text") and shape.text is not None:
-                    if shape.has_text_frame:
-                        # Различаем плейсхолдеры (заголовок, подзаголовок и т.д.)
-                        html_parts.append(self._handle_text(shape))
-                    else:
-                        # Обычный текст без текстового фрейма
-                        html_parts.append(f"<p>{self._escape_html(shape.text)}</p>")
-
-            # Завершаем секцию слайда
-            html_parts.append("</section>")
-
-        # Объединяем все части HTML в одну строку
-        html = "\n".join(html_parts)
-
-        # Конвертируем HTML в PDF с применением стилей
-        HTML(string=html).write_pdf(
-            self.temp_pdf_path, stylesheets=[CSS(string=css), self.get_font_css()]
-        )
+        # Изображения слайдов пишутся файлами во временную директорию, на которую
+        # ссылается HTML, вместо встраивания в base64; после рендера она удаляется
+        with tempfile.TemporaryDirectory(dir=get_temp_dir()) as img_dir:
+            self._img_dir = img_dir
+            try:
+                # Слайды генерируются по одному и сразу пишутся во временный файл,
+                # не собирая HTML в одну строку
+                sections = (
+                    self._render_slide(idx, slide) for idx, slide in enumerate(pptx.slides)
+                )
+                html_path = write_temp_html(sections, separator="\n")
+
+                # Конвертируем HTML в PDF с применением стилей
+                try:
+                    HTML(filename=html_path, encoding="utf-8").write_pdf(
+                        self.temp_pdf_path, stylesheets=[CSS(string=css), self.get_font_css()]
+                    )
+                finally:
+                    remove_file(html_path)
+            finally:
+                self._img_dir = None
+                self._img_files.clear()
 
-    def _handle_group(self, group_shape) -> str:
+    def _render_slide(self, slide_index: int, slide) -> str:
         """
-        Рекурсивно обрабатывает фигуры в группе.
-        
-        Функция проходит по всем фигурам в группе и обрабатывает каждую
-        в зависимости от ее типа (группа, таблица, изображение, текст).
-        
+        Генерирует HTML секцию для одного слайда.
+
         Args:
-            group_shape: Объект группы фигур из python-pptx
-            
+            slide_index (int): Индекс слайда (с нуля)
+            slide: Объект слайда из python-pptx
+
         Returns:
-            str: HTML строка для всей группы фигур
+            str: HTML строка секции слайда
         """
-        from pptx.enum.shapes import MSO_SHAPE_TYPE
+        # Начинаем новую секцию для слайда
+        html_parts = ["<section>"]
+        # Добавляем заголовок слайда, если включена нумерация
+        if self.include_slide_number:
+            html_parts.append(f"<h2>Slide {slide_index + 1}</h2>")
+
+        # Обрабатываем фигуры на слайде
+        self._walk_shapes(slide.shapes, html_parts)
+
+        # Завершаем секцию слайда
+        html_parts.append("</section>")
+        return "\n".join(html_parts)
+
+    def _walk_shapes(self, shapes, out: list) -> list:
+        """
+        Добавляет HTML для каждой фигуры из коллекции в список out.
+
+        Группы и изображения диспетчеризуются по типу фигуры через словарь
+        обработчиков, таблицы и текст определяются по свойствам фигуры.
+
+        Args:
+            shapes: Коллекция фигур из python-pptx
+            out (list): Список, в который добавляются части HTML
 
-        group_parts = []
-        for shape in group_shape.shapes:
-            # Если фигура является группой, обрабатываем рекурсивно
-            if shape.shape_type == MSO_SHAPE_TYPE.GROUP:
-                group_parts.append(self._handle_group(shape))
+        Returns:
+            list: Тот же список out
+        """
+        handlers = self._shape_handlers
+        append = out.append
+        for shape in shapes:
+            # Некоторые фигуры (например, графические фреймы без распознанного
+            # содержимого) не могут сообщить свой тип
+            try:
+                handler = handlers.get(shape.shape_type)
+            except Exception:
+                handler = None
+
+            # Группы обрабатываются рекурсивно, изображения встраиваются
+            if handler is not None:
+                append(handler(shape))
                 continue
 
             # Если фигура содержит таблицу
             if shape.has_table:
-                group_parts.append(self._handle_table(shape))
-                continue
-
-            # Если фигура является изображением
-            if shape.shape_type == MSO_SHAPE_TYPE.PICTURE:
-                group_parts.append(self._handle_image(shape))
+                append(self._handle_table(shape))
                 continue
 
             # Если фигура содержит текст
-            if hasattr(shape, "text"):
+            if hasattr(shape, "text") and shape.text is not None:
                 if shape.has_text_frame:
-                    group_parts.append(self._handle_text(shape))
+                    # Различаем плейсхолдеры (заголовок, подзаголовок и т.д.)
+                    append(self._handle_text(shape))
                 else:
-                    group_parts.append(f"<p>{self._escape_html(shape.text)}</p>")
+                    # Обычный текст без текстового фрейма
+                    append(f"<p>{self._escape_html(shape.text)}</p>")
+        return out
 
+    def _handle_group(self, group_shape) -> str:
+        """
+        Рекурсивно обрабатывает фигуры в группе.
+        
+        Функция проходит по всем фигурам в группе и обрабатывает каждую
+        в зависимости от ее типа (группа, таблица, изображение, текст).
+        
+        Args:
+            group_shape: Объект группы фигур из python-pptx
+            
+        Returns:
+            str: HTML строка для всей группы фигур
+        """
+        group_parts = self._walk_shapes(group_shape.shapes, [])
         return "".join(group_parts)
 
     def _handle_text(self, shape) -> str:
@@ -228,69 +283,62 @@ class PowerPointProvider(PdfProvider):
         Returns:
             str: HTML строка для текстового блока
         """
-        from pptx.enum.shapes import PP_PLACEHOLDER
-
         # Определяем HTML тег на основе типа плейсхолдера
         label_html_tag = "p"
         if shape.is_placeholder:
             placeholder_type = shape.placeholder_format.type
-            if placeholder_type in [PP_PLACEHOLDER.TITLE, PP_PLACEHOLDER.CENTER_TITLE]:
+            if placeholder_type in _TITLE_PLACEHOLDERS:
                 label_html_tag = "h3"
-            elif placeholder_type == PP_PLACEHOLDER.SUBTITLE:
+            elif placeholder_type is _SUBTITLE:
                 label_html_tag = "h4"
 
+        open_tag = f"<{label_html_tag}>"
+        close_tag = f"</{label_html_tag}>"
+        escape = self._escape_html
+
         # Следим за тем, находимся ли мы в списке <ul> или <ol>
         html_parts = []
+        append = html_parts.append
         list_open = False
         list_type = None  # "ul" или "ol"
 
         # Обрабатываем каждый параграф в текстовом фрейме
         for paragraph in shape.text_frame.paragraphs:
             p_el = paragraph._element
-            # Проверяем маркеры списков
-            bullet_char = p_el.find(".//a:buChar", namespaces=p_el.nsmap)
-            bullet_num = p_el.find(".//a:buAutoNum", namespaces=p_el.nsmap)
-
-            # Определяем тип списка
-            is_bullet = (bullet_char is not None) or (paragraph.level > 0)
-            is_numbered = bullet_num is not None
-
-            # Если параграф является элементом списка
-            if is_bullet or is_numbered:
-                # Определяем тип текущего списка
-                current_list_type = "ol" if is_numbered else "ul"
-                if not list_open:
-                    # Начинаем новый список
-                    list_open = True
-                    list_type = current_list_type
-                    html_parts.append(f"<{list_type}>")
-
-                elif list_open and list_type != current_list_type:
-                    # Закрываем старый список и начинаем новый
-                    html_parts.append(f"</{list_type}>")
-                    list_type = current_list_type
-                    html_parts.append(f"<{list_type}>")
-
-                # Собираем текст элемента списка из всех runs
-                p_text = "".join(run.text for run in paragraph.runs)
-                if p_text:
-                    html_parts.append(f"<li>{self._escape_html(p_text)}</li>")
+            # Собираем текст параграфа из всех runs один раз. paragraph.text не
+            # используется: он добавляет переводы строк и поля, которых нет в runs
+            p_text = "".join([run.text for run in paragraph.runs])
 
-            else:
+            # Быстрый путь для самого частого случая - обычного параграфа без маркеров:
+            # одна предкомпилированная проверка XPath, возвращающая bool
+            if paragraph.level == 0 and not _HAS_BULLET(p_el):
                 # Если мы были в списке, закрываем его
                 if list_open:
-                    html_parts.append(f"</{list_type}>")
+                    append(f"</{list_type}>")
                     list_open = False
                     list_type = None
 
-                # Обычный параграф
-                # Собираем текст параграфа из всех runs
-                p_text = "".join(run.text for run in paragraph.runs)
+                # Обычный параграф с тегом, соответствующим плейсхолдеру
                 if p_text:
-                    # Используем соответствующий HTML тег
-                    html_parts.append(
-                        f"<{label_html_tag}>{self._escape_html(p_text)}</{label_html_tag}>"
-                    )
+                    append(f"{open_tag}{escape(p_text)}{close_tag}")
+                continue
+
+            # Параграф является элементом списка; определяем тип текущего списка
+            current_list_type = "ol" if _BU_NUM(p_el) else "ul"
+            if not list_open:
+                # Начинаем новый список
+                list_open = True
+                list_type = current_list_type
+                append(f"<{list_type}>")
+
+            elif list_type != current_list_type:
+                # Закрываем старый список и начинаем новый
+                append(f"</{list_type}>")
+                list_type = current_list_type
+                append(f"<{list_type}>")
+
+            if p_text:
+                append(f"<li>{escape(p_text)}</li>")
 
         # Если текстовый фрейм закончился, а список все еще открыт, закрываем его
         if list_open:
@@ -300,27 +348,46 @@ class PowerPointProvider(PdfProvider):
 
     def _handle_image(self, shape) -> str:
         """
-        Встраивает изображение как base64 <img> в HTML.
+        Добавляет изображение фигуры в HTML как тег <img>.
         
-        Извлекает изображение из фигуры презентации и конвертирует его
-        в base64 строку для встраивания в HTML.
+        Байты берутся напрямую из части пакета PPTX, без shape.image: он
+        создает новый объект Image на каждый вызов и открывает картинку через
+        Pillow ради расширения. Во время конвертации каждая часть записывается
+        файлом во временную директорию один раз (изображение, используемое на
+        нескольких слайдах, - одна часть пакета), и тег ссылается на него через
+        file:// URL. Вне конвертации изображение встраивается в base64.
         
         Args:
             shape: Объект фигуры с изображением из python-pptx
             
         Returns:
-            str: HTML тег img с base64 изображением или пустая строка при ошибке
+            str: HTML тег img или пустая строка при ошибке
         """
-        image = shape.image
-        image_bytes = image.blob
-
         try:
-            # Кодируем изображение в base64
-            img_str = base64.b64encode(image_bytes).decode("utf-8")
-            return f"<img src='data:{image.content_type};base64,{img_str}' />"
+            rId = shape._element.blip_rId
+            if rId is None:
+                raise ValueError("picture has no embedded image")
+            image_part = shape.part.related_part(rId)
+
+            img_dir = self._img_dir
+            if img_dir is not None:
+                partname = image_part.partname
+                path = self._img_files.get(partname)
+                if path is None:
+                    # Имя части уникально внутри пакета: "/ppt/media/image1.png"
+                    path = os.path.join(img_dir, partname.lstrip("/").replace("/", "_"))
+                    with open(path, "wb") as f:
+                        f.write(image_part.blob)
+                    self._img_files[partname] = path
+                return f"<img src='{pathlib.Path(path).as_uri()}' />"
+
+            # Собираем тег целиком в bytes и декодируем один раз: base64 всегда ASCII,
+            # поэтому промежуточная строка с закодированным изображением не нужна
+            prefix = f"<img src='data:{image_part.content_type};base64,".encode("ascii")
+            return b"".join((prefix, base64.b64encode(image_part.blob), b"' />")).decode("ascii")
         except Exception as e:
             # Логируем предупреждение при ошибке загрузки изображения
-            logger.warning(f"Warning: image cannot be loaded by Pillow: {e}")
+            logger.warning(f"Warning: image cannot be loaded: {e}")
             return ""
 
     def _handle_table(self, shape) -> str:
@@ -350,11 +417,12 @@ class PowerPointProvider(PdfProvider):
         table_html.append("</table>")
         return "".join(table_html)
 
-    def _escape_html(self, text: str) -> str:
+    @staticmethod
+    def _escape_html(text: str) -> str:
         """
         Минимальное экранирование HTML специальных символов.
         
-        Заменяет HTML метасимволы на их эквиваленты для безопасного отображения.
+        Заменяет HTML метасимволы на их эквиваленты за один проход str.translate.
         
         Args:
             text (str): Исходный текст для экранирования
@@ -362,10 +430,4 @@ class PowerPointProvider(PdfProvider):
         Returns:
             str: Экранированный текст
         """
-        return (
-            text.replace("&", "&amp;")
-            .replace("<", "&lt;")
-            .replace(">", "&gt;")
-            .replace('"', "&quot;")
-            .replace("'", "&#39;")
-        )
+        return text.translate(HTML_ESCAPE_TABLE)
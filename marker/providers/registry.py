@@ -10,18 +10,16 @@
 Автор: Marker Team
 """
 
-import filetype
+import codecs
+import importlib
+import os
+import re
+from functools import lru_cache
+
 import filetype.match as file_match
-from bs4 import BeautifulSoup
 from filetype.types import archive, document, IMAGE
+from filetype.utils import get_signature_bytes
 
-from marker.providers.document import DocumentProvider
-from marker.providers.epub import EpubProvider
-from marker.providers.html import HTMLProvider
-from marker.providers.image import ImageProvider
-from marker.providers.pdf import PdfProvider
-from marker.providers.powerpoint import PowerPointProvider
-from marker.providers.spreadsheet import SpreadSheetProvider
 
 # Словарь соответствий типов документов и их обработчиков
 # Ключ: строка типа документа, Значение: список классов-обработчиков из библиотеки filetype
@@ -45,6 +43,35 @@ DOCTYPE_MATCHERS = {
 }
 
 
+# Провайдеры импортируются лениво при первом обращении: их модули подтягивают
+# тяжелые зависимости (WeasyPrint, python-pptx, openpyxl, pypdfium2)
+# Ключ: тип провайдера, Значение: (модуль, имя класса)
+PROVIDER_PATHS = {
+    "image": ("marker.providers.image", "ImageProvider"),
+    "pdf": ("marker.providers.pdf", "PdfProvider"),
+    "epub": ("marker.providers.epub", "EpubProvider"),
+    "doc": ("marker.providers.document", "DocumentProvider"),
+    "xls": ("marker.providers.spreadsheet", "SpreadSheetProvider"),
+    "ppt": ("marker.providers.powerpoint", "PowerPointProvider"),
+    "html": ("marker.providers.html", "HTMLProvider"),
+}
+
+
+@lru_cache(maxsize=None)
+def load_provider(provider_type: str):
+    """
+    Импортирует и возвращает класс провайдера для указанного типа.
+
+    Args:
+        provider_type (str): Тип провайдера (ключ PROVIDER_PATHS)
+
+    Returns:
+        type: Класс провайдера
+    """
+    module_name, class_name = PROVIDER_PATHS[provider_type]
+    return getattr(importlib.import_module(module_name), class_name)
+
+
 def load_matchers(doctype: str):
     """
     Загружает список обработчиков для указанного типа документа.
@@ -55,7 +82,11 @@ def load_matchers(doctype: str):
     Returns:
         list: Список экземпляров классов-обработчиков для библиотеки filetype
     """
-    return [cls() for cls in DOCTYPE_MATCHERS[doctype]]
+    # filetype.types.IMAGE уже содержит экземпляры, остальные списки - классы
+    return [
+        matcher() if isinstance(matcher, type) else matcher
+        for matcher in DOCTYPE_MATCHERS[doctype]
+    ]
 
 
 def load_extensions(doctype: str):
@@ -71,6 +102,46 @@ def load_extensions(doctype: str):
     return [cls.EXTENSION for cls in DOCTYPE_MATCHERS[doctype]]
 
 
+# Предвычисленное соответствие расширений файлов типам провайдеров. Порядок совпадает
+# с порядком проверок: при совпадении расширений выигрывает первый тип документа
+_EXT_TO_PROVIDER = {}
+for _doctype in ("image", "pdf", "doc", "xls", "ppt", "epub"):
+    for _ext in load_extensions(_doctype):
+        _EXT_TO_PROVIDER.setdefault(_ext, _doctype)
+# Особый случай для HTML файлов
+_EXT_TO_PROVIDER.setdefault("html", "html")
+del _doctype, _ext
+
+
+# Экземпляры обработчиков filetype, создаваемые один раз при импорте модуля
+_MATCHERS = {doctype: load_matchers(doctype) for doctype in DOCTYPE_MATCHERS}
+
+# Порядок проверки типов документов по сигнатуре файла
+_SIGNATURE_DOCTYPES = ("image", "pdf", "epub", "doc", "xls", "ppt")
+
+
+# Открывающий HTML тег: "<" и имя элемента, за которым следует пробел, "/" или ">"
+_HTML_TAG_RE = re.compile(rb"<[A-Za-z][A-Za-z0-9-]*[\s/>]")
+
+
+def _is_html(head: bytes) -> bool:
+    """
+    Быстрая проверка начала файла на HTML разметку.
+
+    Args:
+        head (bytes): Первые байты файла
+
+    Returns:
+        bool: True, если начало файла - текст в UTF-8 с HTML тегом
+    """
+    try:
+        # Неполный многобайтовый символ в конце буфера допустим
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+    except UnicodeDecodeError:
+        return False
+    return _HTML_TAG_RE.search(head) is not None
+
+
 def provider_from_ext(filepath: str):
     """
     Определяет провайдера на основе расширения файла.
@@ -84,37 +155,11 @@ def provider_from_ext(filepath: str):
     Returns:
         type: Класс провайдера для данного типа файла
     """
-    # Извлекаем расширение файла (все символы после последней точки)
-    ext = filepath.rsplit(".", 1)[-1].strip()
-    
-    # Если расширение отсутствует или пустое, используем PDF провайдер по умолчанию
-    if not ext:
-        return PdfProvider
-
-    # Проверяем соответствие расширения типу "изображение" и возвращаем ImageProvider
-    if ext in load_extensions("image"):
-        return ImageProvider
-    # Проверяем соответствие расширения типу "PDF" и возвращаем PdfProvider
-    if ext in load_extensions("pdf"):
-        return PdfProvider
-    # Проверяем соответствие расширения типу "документ" и возвращаем DocumentProvider
-    if ext in load_extensions("doc"):
-        return DocumentProvider
-    # Проверяем соответствие расширения типу "таблица" и возвращаем SpreadSheetProvider
-    if ext in load_extensions("xls"):
-        return SpreadSheetProvider
-    # Проверяем соответствие расширения типу "презентация" и возвращаем PowerPointProvider
-    if ext in load_extensions("ppt"):
-        return PowerPointProvider
-    # Проверяем соответствие расширения типу "EPUB" и возвращаем EpubProvider
-    if ext in load_extensions("epub"):
-        return EpubProvider
-    # Особый случай для HTML файлов
-    if ext in ["html"]:
-        return HTMLProvider
-
-    # Если тип файла не распознан, возвращаем PDF провайдер как fallback
-    return PdfProvider
+    # Извлекаем расширение файла без точки, в нижнем регистре
+    ext = os.path.splitext(filepath)[1][1:].strip().lower()
+
+    # Один поиск в словаре; нераспознанные и пустые расширения - PDF провайдер
+    return load_provider(_EXT_TO_PROVIDER.get(ext, "pdf"))
 
 
 def provider_from_filepath(filepath: str):
@@ -130,37 +175,19 @@ def provider_from_filepath(filepath: str):
     Returns:
         type: Класс провайдера для данного типа файла
     """
-    # Проверяем, является ли файл изображением по его содержимому
-    if filetype.image_match(filepath) is not None:
-        return ImageProvider
-    # Проверяем, является ли файл PDF документом
-    if file_match(filepath, load_matchers("pdf")) is not None:
-        return PdfProvider
-    # Проверяем, является ли файл EPUB книгой
-    if file_match(filepath, load_matchers("epub")) is not None:
-        return EpubProvider
-    # Проверяем, является ли файл документом (DOCX, ODT)
-    if file_match(filepath, load_matchers("doc")) is not None:
-        return DocumentProvider
-    # Проверяем, является ли файл электронной таблицей (XLSX, XLS)
-    if file_match(filepath, load_matchers("xls")) is not None:
-        return SpreadSheetProvider
-    # Проверяем, является ли файл презентацией (PPTX)
-    if file_match(filepath, load_matchers("ppt")) is not None:
-        return PowerPointProvider
-
-    # Попытка определить HTML файл по его содержимому
-    try:
-        # Открываем файл как текст с кодировкой UTF-8
-        with open(filepath, "r", encoding="utf-8") as f:
-            # Парсим содержимое с помощью BeautifulSoup
-            soup = BeautifulSoup(f.read(), "html.parser")
-            # Проверяем, есть ли HTML теги в содержимом
-            if bool(soup.find()):
-                return HTMLProvider
-    except Exception:
-        # Если чтение файла не удалось, игнорируем ошибку
-        pass
+    # Читаем сигнатуру файла один раз и передаем один и тот же буфер всем
+    # обработчикам вместо повторного открытия файла для каждой проверки
+    head = get_signature_bytes(filepath)
+
+    # Проверяем типы по порядку: изображение, PDF, EPUB, документ, таблица, презентация
+    for doctype in _SIGNATURE_DOCTYPES:
+        if file_match(head, _MATCHERS[doctype]) is not None:
+            return load_provider(doctype)
+
+    # Попытка определить HTML файл по его содержимому: ищем открывающий тег в
+    # уже прочитанной сигнатуре вместо полного разбора файла BeautifulSoup
+    if _is_html(head):
+        return load_provider("html")
 
     # Fallback: если не удалось определить тип файла,
     # используем метод определения по расширению
@@ -9,10 +9,17 @@
 Автор: Marker Team
 """
 
-import os
-import tempfile
+from typing import Annotated
 
+import numpy as np
+
+from marker.logger import get_logger
 from marker.providers.pdf import PdfProvider
+from marker.providers.utils import create_temp_pdf, escape_html, remove_file, write_temp_html
+from marker.util import assign_config
+
+# Инициализируем логгер для записи предупреждений
+logger = get_logger()
 
 # CSS стили для отображения таблиц в альбомной ориентации
 css = '''
@@ -55,6 +62,18 @@ class SpreadSheetProvider(PdfProvider):
     5. Конвертация HTML в PDF
     6. Инициализация родительского PdfProvider с временным PDF
     """
+    # Рисовать таблицы напрямую через reportlab вместо HTML + WeasyPrint
+    use_reportlab: Annotated[
+        bool,
+        "Рисовать таблицы напрямую через reportlab вместо HTML и WeasyPrint.",
+        "Быстрее для больших таблиц, но без CSS и с базовыми шрифтами reportlab.",
+    ] = False
+    flatten_pdf: Annotated[
+        bool,
+        "Выравнивать ли структуру PDF.",
+        "Промежуточный PDF генерируется WeasyPrint (или reportlab) без форм и аннотаций, поэтому по умолчанию не выравнивается.",
+    ] = False
+
     def __init__(self, filepath: str, config=None):
         """
         Инициализация провайдера электронных таблиц.
@@ -63,10 +82,12 @@ class SpreadSheetProvider(PdfProvider):
             filepath (str): Путь к XLSX/CSV файлу
             config: Конфигурация провайдера (опционально)
         """
-        # Создаем временный PDF файл для промежуточного хранения
-        temp_pdf = tempfile.NamedTemporaryFile(delete=False, suffix=f".pdf")
-        self.temp_pdf_path = temp_pdf.name
-        temp_pdf.close()
+        # Создаем временный PDF файл для промежуточного хранения (по возможности в tmpfs).
+        # Файл удаляется автоматически при уничтожении провайдера
+        self.temp_pdf_path = create_temp_pdf(self)
+
+        # Конфигурация нужна до конвертации (например, флаг use_reportlab)
+        assign_config(self, config)
 
         # Конвертируем XLSX в PDF
         try:
@@ -78,15 +99,6 @@ class SpreadSheetProvider(PdfProvider):
         # Инициализируем родительский PdfProvider с временным PDF файлом
         super().__init__(self.temp_pdf_path, config)
 
-    def __del__(self):
-        """
-        Деструктор для очистки временных файлов.
-        
-        Удаляет временный PDF файл при уничтожении объекта.
-        """
-        if os.path.exists(self.temp_pdf_path):
-            os.remove(self.temp_pdf_path)
-
     def convert_xlsx_to_pdf(self, filepath: str):
         """
         Конвертирует XLSX файл в PDF формат.
@@ -100,27 +112,184 @@ class SpreadSheetProvider(PdfProvider):
         Args:
             filepath (str): Путь к исходному XLSX файлу
         """
+        if self.use_reportlab:
+            try:
+                return self._convert_xlsx_to_pdf_reportlab(filepath)
+            except ImportError:
+                logger.warning("reportlab is not installed, falling back to WeasyPrint")
+
         from weasyprint import CSS, HTML
-        from openpyxl import load_workbook
 
-        html = ""
-        # Загружаем рабочую книгу Excel
-        workbook = load_workbook(filepath)
-        if workbook is not None:
-            # Обрабатываем каждый лист
+        html_parts = []
+        workbook, formula_workbook = self._load_workbooks(filepath)
+        try:
+            # Скрытые листы не попадают в выходной документ
+            sheets = [
+                workbook[sheet_name] for sheet_name in workbook.sheetnames
+                if workbook[sheet_name].sheet_state == 'visible'
+            ]
+            tables = [
+                self._excel_to_html_table(sheet, formula_workbook[sheet.title])
+                for sheet in sheets
+            ]
+        finally:
+            workbook.close()
+            formula_workbook.close()
+
+        # Создаем HTML секцию для каждого листа с заголовком и таблицей
+        for sheet, table in zip(sheets, tables):
+            html_parts.extend((
+                '<div><h1>', escape_html(sheet.title), '</h1>', table, '</div>'
+            ))
+
+        # Пишем HTML во временный файл по частям, не собирая его в одну строку
+        html_path = write_temp_html(html_parts)
+
+        # Конвертируем HTML в PDF с применением стилей
+        try:
+            HTML(filename=html_path, encoding="utf-8").write_pdf(
+                self.temp_pdf_path,
+                stylesheets=[CSS(string=css), self.get_font_css()]
+            )
+        finally:
+            remove_file(html_path)
+
+    def _convert_xlsx_to_pdf_reportlab(self, filepath: str):
+        """
+        Конвертирует XLSX файл в PDF, рисуя таблицы напрямую через reportlab.
+
+        Пропускает генерацию HTML и верстку WeasyPrint. Объединенные ячейки
+        передаются как SPAN стили таблицы.
+
+        Args:
+            filepath (str): Путь к исходному XLSX файлу
+        """
+        from reportlab.lib import colors
+        from reportlab.lib.pagesizes import A4, landscape
+        from reportlab.lib.styles import getSampleStyleSheet
+        from reportlab.lib.units import cm
+        from reportlab.platypus import LongTable, Paragraph, SimpleDocTemplate, Spacer, TableStyle
+
+        styles = getSampleStyleSheet()
+        heading_style = styles["Heading1"]
+        cell_style = styles["BodyText"]
+        cell_style.fontSize = 10
+
+        doc = SimpleDocTemplate(
+            self.temp_pdf_path,
+            pagesize=landscape(A4),
+            leftMargin=1.5 * cm,
+            rightMargin=1.5 * cm,
+            topMargin=1.5 * cm,
+            bottomMargin=1.5 * cm,
+        )
+
+        workbook, formula_workbook = self._load_workbooks(filepath)
+
+        story = []
+        try:
             for sheet_name in workbook.sheetnames:
                 sheet = workbook[sheet_name]
-                # Создаем HTML секцию для каждого листа с заголовком и таблицей
-                html += f'<div><h1>{sheet_name}</h1>' + self._excel_to_html_table(sheet) + '</div>'
-        else:
+                # Скрытые листы не попадают в выходной документ
+                if sheet.sheet_state != 'visible':
+                    continue
+
+                story.append(Paragraph(escape_html(sheet.title), heading_style))
+                data = [
+                    [
+                        Paragraph(escape_html(str(value)), cell_style) if value is not None else ''
+                        for value in row
+                    ]
+                    for row in self._iter_sheet_values(sheet, formula_workbook[sheet_name])
+                ]
+                if not data or not data[0]:
+                    continue
+
+                # Объединенные ячейки: SPAN принимает (столбец, строка) с нуля
+                table_style = [
+                    ('GRID', (0, 0), (-1, -1), 0.75, colors.black),
+                    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+                ]
+                for (row, col), info in self._get_merged_cell_ranges(sheet).items():
+                    table_style.append((
+                        'SPAN',
+                        (col - 1, row - 1),
+                        (col + info['colspan'] - 2, row + info['rowspan'] - 2),
+                    ))
+
+                n_cols = max(len(row) for row in data)
+                for row in data:
+                    row.extend([''] * (n_cols - len(row)))
+                table = LongTable(data, colWidths=[doc.width / n_cols] * n_cols, repeatRows=1)
+                table.setStyle(TableStyle(table_style))
+                story.append(table)
+        finally:
+            workbook.close()
+            formula_workbook.close()
+
+        # Все листы скрыты: как и WeasyPrint для пустого HTML, выводим одну пустую страницу
+        if not story:
+            story.append(Spacer(0, 0))
+
+        doc.build(story)
+
+    @staticmethod
+    def _load_workbooks(filepath: str):
+        """
+        Загружает рабочую книгу Excel с вычисленными значениями и с формулами.
+
+        Вычисленные значения берутся из кэша, который сохраняет Excel. Книги,
+        записанные openpyxl и другими программами без вычисления формул, кэша
+        не содержат, поэтому для таких ячеек нужна вторая загрузка с формулами.
+        read_only не используется, так как ReadOnlyWorksheet не предоставляет
+        информацию об объединенных ячейках.
+
+        Args:
+            filepath (str): Путь к исходному XLSX файлу
+
+        Returns:
+            tuple: (книга с вычисленными значениями, книга с формулами)
+        """
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(filepath, data_only=True, keep_links=False)
+        if workbook is None:
             # Если не удалось загрузить файл, выбрасываем исключение
             raise ValueError("Invalid XLSX file")
+        try:
+            formula_workbook = load_workbook(filepath, keep_links=False)
+        except Exception:
+            workbook.close()
+            raise
+        return workbook, formula_workbook
 
-        # Конвертируем HTML в PDF с применением стилей
-        HTML(string=html).write_pdf(
-            self.temp_pdf_path,
-            stylesheets=[CSS(string=css), self.get_font_css()]
-        )
+    @staticmethod
+    def _iter_sheet_values(sheet, formula_sheet=None):
+        """
+        Итерирует значения строк листа с подстановкой формул вместо пустого кэша.
+
+        Args:
+            sheet: Лист книги, загруженной с data_only=True
+            formula_sheet: Тот же лист из книги с формулами или None
+
+        Yields:
+            tuple: Значения ячеек строки; для формул без вычисленного значения -
+            текст формулы
+        """
+        # values_only отдает кортежи значений без обращения к объектам Cell
+        rows = sheet.iter_rows(values_only=True)
+        if formula_sheet is None:
+            yield from rows
+            return
+
+        for row, formulas in zip(rows, formula_sheet.iter_rows(values_only=True)):
+            if None in row:
+                row = tuple(
+                    formula if value is None and isinstance(formula, str) and formula.startswith('=')
+                    else value
+                    for value, formula in zip(row, formulas)
+                )
+            yield row
 
     @staticmethod
     def _get_merged_cell_ranges(sheet):
@@ -148,7 +317,40 @@ class SpreadSheetProvider(PdfProvider):
             }
         return merged_info
 
-    def _excel_to_html_table(self, sheet):
+    @staticmethod
+    def _get_skip_mask(merged_cells):
+        """
+        Строит маску ячеек, которые нужно пропустить из-за объединения.
+
+        Маска покрывает только прямоугольник, охватывающий все объединенные
+        диапазоны, а не весь лист, поэтому ее размер не зависит от числа строк
+        таблицы. Диапазоны закрашиваются срезами в булевом массиве NumPy.
+
+        Args:
+            merged_cells (dict): Информация об объединенных ячейках
+
+        Returns:
+            tuple | None: (первая строка, первый столбец, маска) с индексацией
+            листа с 1, True - ячейку нужно пропустить; None, если объединений нет
+        """
+        if not merged_cells:
+            return None
+
+        min_row = min(row for row, _ in merged_cells)
+        min_col = min(col for _, col in merged_cells)
+        max_row = max(row + info['rowspan'] - 1 for (row, _), info in merged_cells.items())
+        max_col = max(col + info['colspan'] - 1 for (_, col), info in merged_cells.items())
+
+        skip = np.zeros((max_row - min_row + 1, max_col - min_col + 1), dtype=np.bool_)
+        for (row, col), info in merged_cells.items():
+            r, c = row - min_row, col - min_col
+            skip[r:r + info['rowspan'], c:c + info['colspan']] = True
+        # Левая верхняя ячейка диапазона выводится с rowspan/colspan
+        for row, col in merged_cells:
+            skip[row - min_row, col - min_col] = False
+        return min_row, min_col, skip
+
+    def _excel_to_html_table(self, sheet, formula_sheet=None):
         """
         Преобразует лист Excel в HTML таблицу.
         
@@ -157,6 +359,8 @@ class SpreadSheetProvider(PdfProvider):
         
         Args:
             sheet: Объект листа из openpyxl
+            formula_sheet: Тот же лист из книги с формулами; его формулы
+                выводятся в ячейках без вычисленного значения
             
         Returns:
             str: HTML строка с таблицей
@@ -164,39 +368,38 @@ class SpreadSheetProvider(PdfProvider):
         # Получаем информацию об объединенных ячейках
         merged_cells = self._get_merged_cell_ranges(sheet)
 
-        # Начинаем создавать HTML таблицу
-        html = f'<table>'
+        # Накапливаем части HTML в списке вместо квадратичной конкатенации строк
+        parts = ['<table>']
+        append = parts.append
 
-        # Множество для отслеживания ячеек, которые нужно пропустить
-        skip_cells = set()
+        # Маска ячеек, покрытых объединенными диапазонами (кроме их левой верхней ячейки)
+        skip_mask = self._get_skip_mask(merged_cells)
+        if skip_mask is not None:
+            mask_row, mask_col, skip = skip_mask
 
         # Обрабатываем каждую строку
-        for row_idx, row in enumerate(sheet.rows, 1):
-            html += '<tr>'
+        for row_idx, row in enumerate(self._iter_sheet_values(sheet, formula_sheet), 1):
+            append('<tr>')
+            # Номера пропускаемых столбцов строки (пусто вне строк с объединениями)
+            skip_cols = ()
+            if skip_mask is not None and 0 <= row_idx - mask_row < len(skip):
+                skip_cols = set((np.flatnonzero(skip[row_idx - mask_row]) + mask_col).tolist())
             # Обрабатываем каждую ячейку в строке
-            for col_idx, cell in enumerate(row, 1):
+            for col_idx, value in enumerate(row, 1):
                 # Пропускаем ячейки, которые являются частью объединенного диапазона
-                if (row_idx, col_idx) in skip_cells:
+                if skip_cols and col_idx in skip_cols:
                     continue
 
+                value = escape_html(str(value)) if value is not None else ''
+
                 # Проверяем, является ли эта ячейка началом объединенного диапазона
                 merge_info = merged_cells.get((row_idx, col_idx))
                 if merge_info:
-                    # Добавляем ячейки в список для пропуска
-                    for r in range(row_idx, row_idx + merge_info['rowspan']):
-                        for c in range(col_idx, col_idx + merge_info['colspan']):
-                            if (r, c) != (row_idx, col_idx):
-                                skip_cells.add((r, c))
-
                     # Добавляем объединенную ячейку с rowspan и colspan
-                    value = cell.value if cell.value is not None else ''
-                    html += f'<td rowspan="{merge_info["rowspan"]}" colspan="{merge_info["colspan"]}">{value}'
+                    append(f'<td rowspan="{merge_info["rowspan"]}" colspan="{merge_info["colspan"]}">{value}</td>')
                 else:
                     # Обычная ячейка
-                    value = cell.value if cell.value is not None else ''
-                    html += f'<td>{value}'
-
-                html += '</td>'
-            html += '</tr>'
-        html += '</table>'
-        return html
+                    append(f'<td>{value}</td>')
+            append('</tr>')
+        append('</table>')
+        return "".join(parts)
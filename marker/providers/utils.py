@@ -7,6 +7,149 @@
 Автор: Marker Team
 """
 
+import os
+import tempfile
+import weakref
+from typing import Dict, Optional
+
+from marker.settings import settings
+
+
+def get_temp_dir() -> Optional[str]:
+    """
+    Возвращает директорию для промежуточных PDF и HTML файлов.
+
+    По умолчанию используется системная временная директория. /dev/shm (tmpfs в
+    оперативной памяти) включается настройкой TEMP_DIR_USE_SHM: в Docker и
+    Kubernetes он по умолчанию ограничен 64 МБ, и большие документы не помещаются.
+
+    Returns:
+        Optional[str]: Путь к директории или None (системная директория по умолчанию)
+    """
+    if not settings.TEMP_DIR_USE_SHM:
+        return None
+
+    shm_dir = "/dev/shm"
+    if os.path.isdir(shm_dir) and os.access(shm_dir, os.W_OK | os.X_OK):
+        return shm_dir
+    return None
+
+
+def remove_file(path: str):
+    """
+    Удаляет файл, игнорируя ошибку, если он уже удален.
+
+    Args:
+        path (str): Путь к файлу
+    """
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# Финализаторы временных файлов, созданных create_temp_pdf: {путь: finalize}
+_TEMP_FILE_FINALIZERS: Dict[str, weakref.finalize] = {}
+
+
+def _cleanup_temp_file(path: str):
+    _TEMP_FILE_FINALIZERS.pop(path, None)
+    remove_file(path)
+
+
+def create_temp_pdf(owner: object, dir: Optional[str] = None) -> str:
+    """
+    Создает пустой временный PDF файл, время жизни которого привязано к владельцу.
+
+    Файл удаляется через weakref.finalize при сборке владельца (или при выходе
+    из интерпретатора), что надежнее, чем __del__. Удалить файл раньше или
+    передать его другому владельцу можно через release_temp_file.
+
+    Args:
+        owner (object): Объект, после уничтожения которого файл будет удален
+        dir (Optional[str]): Директория для файла (по умолчанию get_temp_dir())
+
+    Returns:
+        str: Путь к временному PDF файлу
+    """
+    fd, path = tempfile.mkstemp(suffix=".pdf", dir=dir or get_temp_dir())
+    os.close(fd)
+    _TEMP_FILE_FINALIZERS[path] = weakref.finalize(owner, _cleanup_temp_file, path)
+    return path
+
+
+def release_temp_file(path: str, delete: bool = True):
+    """
+    Снимает временный файл create_temp_pdf с финализатора владельца.
+
+    Повторный вызов и вызов для чужого пути безопасны.
+
+    Args:
+        path (str): Путь, возвращенный create_temp_pdf
+        delete (bool): Удалить файл сейчас; False - оставить файл на месте
+            (например, он перемещен в кэш и больше не принадлежит владельцу)
+    """
+    finalizer = _TEMP_FILE_FINALIZERS.pop(path, None)
+    if finalizer is None:
+        return
+    if delete:
+        finalizer()
+    else:
+        finalizer.detach()
+
+
+def write_temp_html(parts, separator: str = "") -> str:
+    """
+    Пишет части HTML во временный файл в UTF-8 по мере их кодирования.
+
+    Позволяет передать документ в WeasyPrint через HTML(filename=...), не
+    собирая весь HTML в одну строку. Удаление файла - ответственность вызывающего.
+
+    Args:
+        parts: Итерируемые части HTML (str или bytes)
+        separator (str): Разделитель между частями
+
+    Returns:
+        str: Путь к временному HTML файлу
+    """
+    sep = separator.encode("utf-8")
+    fd, path = tempfile.mkstemp(suffix=".html", dir=get_temp_dir())
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write = f.write
+            for idx, part in enumerate(parts):
+                if idx and sep:
+                    write(sep)
+                write(part if isinstance(part, bytes) else part.encode("utf-8"))
+    except BaseException:
+        remove_file(path)
+        raise
+    return path
+
+
+# Таблица экранирования HTML метасимволов для однопроходного str.translate
+HTML_ESCAPE_TABLE = str.maketrans({
+    "&": "&amp;",
+    "<": "&lt;",
+    ">": "&gt;",
+    '"': "&quot;",
+    "'": "&#39;",
+})
+
+
+def escape_html(text: str) -> str:
+    """
+    Минимальное экранирование HTML специальных символов за один проход.
+
+    Args:
+        text (str): Исходный текст для экранирования
+
+    Returns:
+        str: Экранированный текст
+    """
+    return text.translate(HTML_ESCAPE_TABLE)
+
+
 def alphanum_ratio(text):
     """
     Вычисляет соотношение алфавитно-цифровых символов к общему количеству символов в тексте.
@@ -14,20 +14,86 @@
 - Поддержка различных режимов извлечения изображений (lowres/highres)
 """
 
-import base64
-import io
 import re
 from collections import Counter
 from typing import Annotated, Optional, Tuple, Literal
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, NavigableString
 from pydantic import BaseModel
 
 from marker.schema import BlockTypes
 from marker.schema.blocks.base import BlockId, BlockOutput
 from marker.schema.document import Document
 from marker.settings import settings
-from marker.util import assign_config
+from marker.util import assign_config, image_to_base64
+
+# Кэш скомпилированных шаблонов закрывающих/открывающих тегов для слияния
+# (ключ - кортеж имен тегов); группа 1 - закрывающий тег, группа 2 - открывающий
+_MERGE_TAG_PATTERNS = {}
+# Дефис между последовательными math тегами (обычными и inline) - одним проходом
+_MATH_DASH_PATTERN = re.compile(r'-</math>(\s*)<math(?: display="inline")?>')
+
+
+def _merge_tag_pattern(tags: Tuple[str, ...]) -> re.Pattern:
+    pattern = _MERGE_TAG_PATTERNS.get(tags)
+    if pattern is None:
+        names = "|".join(re.escape(tag) for tag in tags)
+        pattern = re.compile(rf"</({names})>|<({names})>")
+        _MERGE_TAG_PATTERNS[tags] = pattern
+    return pattern
+
+
+def _is_plain_text(html: str) -> bool:
+    # Текст без разметки и entities html.parser возвращает без изменений
+    # (строки только из пробелов он отбрасывает, поэтому их не считаем)
+    return not html.isspace() and "<" not in html and ">" not in html and "&" not in html
+
+
+class LazyBase64Image:
+    """
+    Изображение блока, кодируемое в base64 только при первом чтении.
+    
+    Используется вместо base64 строки при lazy_image_encoding: str(image)
+    выполняет кодирование один раз и кэширует результат. Ссылки на рендерер
+    и документ освобождаются сразу после кодирования.
+    """
+
+    __slots__ = ("_renderer", "_document", "_image_id", "_value")
+
+    def __init__(self, renderer: "BaseRenderer", document: Document, image_id: BlockId):
+        self._renderer = renderer
+        self._document = document
+        self._image_id = image_id
+        self._value = None
+
+    def __str__(self):
+        if self._value is None:
+            self._value = self._renderer.encode_image_base64(self._document, self._image_id)
+            self._renderer = None
+            self._document = None
+        return self._value
+
+    def __repr__(self):
+        state = "encoded" if self._value is not None else "pending"
+        return f"LazyBase64Image({self._image_id}, {state})"
+
+
+def resolve_images(images: dict | None) -> dict | None:
+    """
+    Заменяет отложенные изображения (LazyBase64Image) их base64 строками.
+    
+    Аргументы:
+        images: Словарь изображений {block_id: base64_image} или None
+        
+    Возвращает:
+        dict или None: Словарь, в котором все значения - строки
+    """
+    if not images:
+        return images
+    return {
+        key: str(value) if isinstance(value, LazyBase64Image) else value
+        for key, value in images.items()
+    }
 
 
 class BaseRenderer:
@@ -45,6 +111,8 @@ class BaseRenderer:
         keep_pageheader_in_output: Сохранять ли заголовки страниц в выводе
         keep_pagefooter_in_output: Сохранять ли подвалы страниц в выводе
         add_block_ids: Добавлять ли ID блоков в выходной HTML
+        lazy_image_encoding: Откладывать ли base64 кодирование изображений до
+            их чтения или сериализации вывода
     """
     image_blocks: Annotated[
         Tuple[BlockTypes, ...], "The block types to consider as images."
@@ -63,6 +131,10 @@ class BaseRenderer:
     add_block_ids: Annotated[bool, "Whether to add block IDs to the output HTML."] = (
         False
     )
+    lazy_image_encoding: Annotated[
+        bool,
+        "Defer base64 encoding of extracted images until they are read or the output is serialized.",
+    ] = False
 
     def __init__(self, config: Optional[BaseModel | dict] = None):
         """
@@ -73,6 +145,8 @@ class BaseRenderer:
         """
         # Применяем конфигурацию к атрибутам класса
         assign_config(self, config)
+        # Множество для O(1) проверки типов блоков изображений
+        self._image_blocks_set = frozenset(self.image_blocks)
 
         # Создаем конфигурацию блоков для передачи в document.render()
         self.block_config = {
@@ -80,6 +154,9 @@ class BaseRenderer:
             "keep_pagefooter_in_output": self.keep_pagefooter_in_output,
             "add_block_ids": self.add_block_ids,
         }
+        # Кэш base64 изображений в пределах одного рендеринга: блок изображения
+        # запрашивается и родителем по content-ref, и при обходе самого блока
+        self._img_b64_cache = {}
 
     def __call__(self, document):
         """
@@ -106,7 +183,39 @@ class BaseRenderer:
             to_base64: Конвертировать ли изображение в base64 строку
             
         Возвращает:
-            PIL.Image или str: PIL изображение или base64 строка
+            PIL.Image, str или LazyBase64Image: PIL изображение, base64 строка или
+            отложенное base64 изображение (при lazy_image_encoding)
+        """
+        if not to_base64:
+            # Извлекаем изображение в выбранном режиме качества
+            image_block = document.get_block(image_id)
+            return image_block.get_image(
+                document, highres=self.image_extraction_mode == "highres"
+            )
+
+        cache_key = (id(document), image_id)
+        cached = self._img_b64_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        if self.lazy_image_encoding:
+            # Кодирование выполнится только при чтении/сериализации изображения
+            encoded = LazyBase64Image(self, document, image_id)
+        else:
+            encoded = self.encode_image_base64(document, image_id)
+        self._img_b64_cache[cache_key] = encoded
+        return encoded
+
+    def encode_image_base64(self, document: Document, image_id) -> str:
+        """
+        Вырезает изображение блока и кодирует его в base64 (без кэширования).
+        
+        Аргументы:
+            document: Документ для извлечения изображения
+            image_id: ID блока изображения
+            
+        Возвращает:
+            str: base64 строка изображения в формате settings.OUTPUT_IMAGE_FORMAT
         """
         # Получаем блок изображения
         image_block = document.get_block(image_id)
@@ -115,20 +224,17 @@ class BaseRenderer:
             document, highres=self.image_extraction_mode == "highres"
         )
 
-        # Если нужен base64, конвертируем
-        if to_base64:
-            image_buffer = io.BytesIO()
-            # Конвертируем RGBA в RGB если необходимо
-            if not cropped.mode == "RGB":
-                cropped = cropped.convert("RGB")
-
-            # Сохраняем в буфер в заданном формате
-            cropped.save(image_buffer, format=settings.OUTPUT_IMAGE_FORMAT)
-            # Кодируем в base64
-            cropped = base64.b64encode(image_buffer.getvalue()).decode(
-                settings.OUTPUT_ENCODING
-            )
-        return cropped
+        # Конвертируем в RGB только режимы, которые не сохраняются напрямую
+        if cropped.mode not in ("RGB", "L"):
+            cropped = cropped.convert("RGB")
+
+        return image_to_base64(cropped, settings.OUTPUT_IMAGE_FORMAT)
+
+    def clear_image_cache(self):
+        """
+        Очищает кэш base64 изображений после завершения рендеринга документа.
+        """
+        self._img_b64_cache.clear()
 
     @staticmethod
     def merge_consecutive_math(html, tag="math"):
@@ -147,14 +253,13 @@ class BaseRenderer:
         """
         if not html:
             return html
-        # Удаляем дефис между последовательными math тегами
-        pattern = rf"-</{tag}>(\s*)<{tag}>"
-        html = re.sub(pattern, " ", html)
+        if tag == "math":
+            dash_pattern = _MATH_DASH_PATTERN
+        else:
+            dash_pattern = re.compile(rf'-</{tag}>(\s*)<{tag}(?: display="inline")?>')
 
-        # То же для inline math тегов
-        pattern = rf'-</{tag}>(\s*)<{tag} display="inline">'
-        html = re.sub(pattern, " ", html)
-        return html
+        # Удаляем дефис между последовательными math тегами (обычными и inline)
+        return dash_pattern.sub(" ", html)
 
     @staticmethod
     def merge_consecutive_tags(html, tag):
@@ -162,11 +267,12 @@ class BaseRenderer:
         Сливает последовательные теги одного типа.
         
         Объединяет соседние теги (например, <b></b><b> -> <b>)
-        для более чистого HTML вывода.
+        для более чистого HTML вывода. Несколько тегов, переданных кортежем,
+        сливаются за один проход по строке.
         
         Аргументы:
             html: HTML строка для обработки
-            tag: Имя тега для слияния
+            tag: Имя тега для слияния или кортеж имен
             
         Возвращает:
             str: Обработанный HTML
@@ -174,24 +280,42 @@ class BaseRenderer:
         if not html:
             return html
 
-        def replace_whitespace(match):
-            # Заменяем пробелы между тегами: оставляем один пробел или удаляем
-            whitespace = match.group(1)
-            if len(whitespace) == 0:
-                return ""
-            else:
-                return " "
+        tags = (tag,) if isinstance(tag, str) else tuple(tag)
+        if not any(f"</{name}>" in html for name in tags):
+            return html
 
-        pattern = rf"</{tag}>(\s*)<{tag}>"
+        pattern = _merge_tag_pattern(tags)
 
-        # Повторяем пока есть что сливать
-        while True:
-            new_merged = re.sub(pattern, replace_whitespace, html)
-            if new_merged == html:
-                break
-            html = new_merged
+        # Один проход со стеком: пара </tag>...<tag>, разделённая только пробелами
+        # (и уже слитыми парами), схлопывается в один пробел или пустую строку.
+        # Для одного тега результат совпадает с повторным re.sub до неподвижной точки.
+        parts = []
+        open_closes = []  # (индекс в parts, имя тега) незакрытых </tag> текущей серии
+        pos = 0
+        for match in pattern.finditer(html):
+            gap = html[pos:match.start()]
+            if gap:
+                if not gap.isspace():
+                    open_closes.clear()
+                parts.append(gap)
+            close_name, open_name = match.groups()
+            if close_name is not None:
+                open_closes.append((len(parts), close_name))
+                parts.append(match.group())
+            elif open_closes and open_closes[-1][1] == open_name:
+                start, _ = open_closes.pop()
+                # После </tag> остались только пробелы и результаты слияний
+                replacement = " " if any(parts[start + 1:]) else ""
+                del parts[start:]
+                parts.append(replacement)
+            else:
+                # Открывающий тег без пары прерывает серию
+                open_closes.clear()
+                parts.append(match.group())
+            pos = match.end()
+        parts.append(html[pos:])
 
-        return html
+        return "".join(parts)
 
     def generate_page_stats(self, document: Document, document_output):
         """
@@ -209,10 +333,13 @@ class BaseRenderer:
         """
         page_stats = []
         for page in document.pages:
-            # Подсчитываем количество блоков каждого типа
-            block_counts = Counter(
-                [str(block.block_type) for block in page.children]
-            ).most_common()
+            # Подсчитываем блоки по типу и переводим в строку только уникальные типы
+            block_counts = [
+                (str(block_type), count)
+                for block_type, count in Counter(
+                    block.block_type for block in page.children
+                ).most_common()
+            ]
             # Получаем агрегированные метаданные блоков
             block_metadata = page.aggregate_block_metadata()
             page_stats.append(
@@ -260,39 +387,62 @@ class BaseRenderer:
         Возвращает:
             tuple: (HTML строка, словарь изображений {block_id: base64_image})
         """
-        # Парсим HTML блока
-        soup = BeautifulSoup(block_output.html, "html.parser")
+        soup, images = self.extract_block_soup(document, block_output)
+        return str(soup), images
 
-        # Находим все content-ref теги (ссылки на дочерние блоки)
-        content_refs = soup.find_all("content-ref")
-        ref_block_id = None
+    def extract_block_soup(self, document: Document, block_output: BlockOutput):
+        """
+        Строит дерево BeautifulSoup блока с подставленными дочерними блоками.
+        
+        HTML каждого блока разбирается ровно один раз: деревья дочерних блоков
+        вставляются в родительское дерево напрямую, без сериализации в строку
+        и повторного разбора на каждом уровне вложенности.
+        
+        Аргументы:
+            document: Документ для извлечения данных
+            block_output: Выходные данные блока для обработки
+            
+        Возвращает:
+            tuple: (BeautifulSoup или NavigableString, словарь изображений {block_id: base64_image})
+        """
+        html = block_output.html
         images = {}
+        if "<content-ref" not in html:
+            # Быстрый путь: ссылок на дочерние блоки нет, простой текст не разбираем
+            content_refs = ()
+            soup = NavigableString(html) if _is_plain_text(html) else BeautifulSoup(html, "html.parser")
+        else:
+            # Парсим HTML блока и находим все content-ref теги (ссылки на дочерние блоки)
+            soup = BeautifulSoup(html, "html.parser")
+            content_refs = soup.find_all("content-ref")
+
+        ref_block_id = None
         for ref in content_refs:
             src = ref.get("src")
             sub_images = {}
             # Ищем соответствующий дочерний блок
             for item in block_output.children:
                 if item.id == src:
-                    # Рекурсивно извлекаем HTML дочернего блока
-                    content, sub_images_ = self.extract_block_html(document, item)
+                    # Рекурсивно строим дерево дочернего блока
+                    content, sub_images_ = self.extract_block_soup(document, item)
                     sub_images.update(sub_images_)
                     ref_block_id: BlockId = item.id
                     break
 
             # Если это блок изображения, извлекаем изображение
-            if ref_block_id.block_type in self.image_blocks and self.extract_images:
+            if ref_block_id.block_type in self._image_blocks_set and self.extract_images:
                 images[ref_block_id] = self.extract_image(
                     document, ref_block_id, to_base64=True
                 )
             else:
-                # Иначе заменяем content-ref на реальный контент
+                # Иначе заменяем content-ref на дерево дочернего блока
                 images.update(sub_images)
-                ref.replace_with(BeautifulSoup(content, "html.parser"))
+                ref.replace_with(content)
 
         # Если сам блок является изображением, извлекаем его
-        if block_output.id.block_type in self.image_blocks and self.extract_images:
+        if block_output.id.block_type in self._image_blocks_set and self.extract_images:
             images[block_output.id] = self.extract_image(
                 document, block_output.id, to_base64=True
             )
 
-        return str(soup), images
+        return soup, images
@@ -16,8 +16,9 @@ import html
 from typing import List, Dict
 
 from bs4 import BeautifulSoup
-from pydantic import BaseModel
+from pydantic import BaseModel, field_serializer
 
+from marker.renderers import _is_plain_text, resolve_images
 from marker.renderers.json import JSONRenderer, JSONBlockOutput
 from marker.schema.document import Document
 
@@ -45,6 +46,11 @@ class FlatBlockOutput(BaseModel):
     section_hierarchy: Dict[int, str] | None = None
     images: dict | None = None
 
+    @field_serializer("images")
+    def serialize_images(self, images: dict | None):
+        # Отложенные изображения (lazy_image_encoding) кодируются при сериализации
+        return resolve_images(images)
+
 
 class ChunkOutput(BaseModel):
     """
@@ -59,32 +65,57 @@ class ChunkOutput(BaseModel):
     page_info: Dict[int, dict]
     metadata: dict
 
-def collect_images(block: JSONBlockOutput) -> dict[str, str]:
+def collect_images(block: JSONBlockOutput, cache: dict[int, dict] | None = None) -> dict[str, str]:
     """
-    Рекурсивно собирает все изображения из блока и его дочерних элементов.
+    Собирает все изображения из блока и его дочерних элементов.
+    
+    Дерево обходится итеративно (явный стек, прямой порядок), поэтому глубина
+    вложенности не ограничена стеком вызовов Python.
     
     Аргументы:
         block: JSONBlockOutput блок для обработки
+        cache: Необязательный кэш результатов по id(блока); позволяет не обходить
+            одно и то же поддерево повторно в рамках одного рендеринга
         
     Возвращает:
         dict: Словарь всех изображений {block_id: base64_image}
     """
+    if cache is not None:
+        cached = cache.get(id(block))
+        if cached is not None:
+            return cached
+
     # Листовой блок - возвращаем его изображения
     if not getattr(block, "children", None):
-        return block.images or {}
-    else:
-        # Контейнерный блок - собираем изображения рекурсивно
         images = block.images or {}
-        for child_block in block.children:
-            images.update(collect_images(child_block))
-        return images
+    else:
+        # Контейнерный блок - собираем изображения в новый словарь, не изменяя
+        # images самого блока (результат может быть закэширован). Порядок
+        # обновлений тот же, что у рекурсивного обхода: родитель, затем дети
+        images = {}
+        stack = [block]
+        while stack:
+            current = stack.pop()
+            if current is not block and cache is not None and id(current) in cache:
+                images.update(cache[id(current)])
+                continue
+            if current.images:
+                images.update(current.images)
+            children = getattr(current, "children", None)
+            if children:
+                stack.extend(reversed(children))
+
+    if cache is not None:
+        cache[id(block)] = images
+    return images
 
 def assemble_html_with_images(block: JSONBlockOutput, image_blocks: set[str]) -> str:
     """
     Собирает полный HTML блока, заменяя content-ref на реальный контент.
     
-    Рекурсивно обрабатывает дочерние блоки и вставляет их HTML в родительский.
-    Для блоков изображений добавляет <img> теги.
+    Обходит дочерние блоки итеративно в обратном порядке (сначала дети, затем
+    родитель) и вставляет их HTML в родительский. Для блоков изображений
+    добавляет <img> теги.
     
     Аргументы:
         block: JSONBlockOutput блок для обработки
@@ -93,31 +124,58 @@ def assemble_html_with_images(block: JSONBlockOutput, image_blocks: set[str]) ->
     Возвращает:
         str: Полностью собранный HTML
     """
-    # Листовой блок
-    if not getattr(block, "children", None):
-        # Для изображений добавляем img тег
-        if block.block_type in image_blocks:
-            return f"<p>{block.html}<img src='{block.id}'></p>"
-        else:
-            return block.html
-
-    # Контейнерный блок - рекурсивно собираем HTML дочерних блоков
-    child_html = [assemble_html_with_images(child, image_blocks) for child in block.children]
-    child_ids = [child.id for child in block.children]
-
-    # Парсим HTML блока и заменяем content-ref на реальный контент
-    soup = BeautifulSoup(block.html, "html.parser")
-    content_refs = soup.find_all("content-ref")
-    for ref in content_refs:
-        src_id = ref.attrs["src"]
-        if src_id in child_ids:
-            ref.replace_with(child_html[child_ids.index(src_id)])
-
-    # Возвращаем HTML с декодированными entities
-    return html.unescape(str(soup))
+    assembled = {}  # id(блока) -> собранный HTML
+    # Элементы стека: (блок, None) - блок еще не разобран;
+    # (блок, (soup, content_refs, child_by_id)) - дети собраны, осталось подставить
+    stack = [(block, None)]
+    while stack:
+        current, pending = stack.pop()
+        if pending is not None:
+            # Заменяем content-ref на уже собранный HTML дочерних блоков
+            soup, content_refs, child_by_id = pending
+            for ref in content_refs:
+                child = child_by_id.get(ref.attrs["src"])
+                if child is not None:
+                    ref.replace_with(assembled[id(child)])
+            # HTML с декодированными entities
+            assembled[id(current)] = html.unescape(str(soup))
+            continue
+
+        # Листовой блок
+        if not getattr(current, "children", None):
+            # Для изображений добавляем img тег
+            if current.block_type in image_blocks:
+                assembled[id(current)] = f"<p>{current.html}<img src='{current.id}'></p>"
+            else:
+                assembled[id(current)] = current.html
+            continue
+
+        # Простой текст без ссылок, разметки и entities html.parser возвращает без
+        # изменений, поэтому его не разбираем. HTML с разметкой разбирается всегда:
+        # HTML блоков (например, таблиц) не нормализован, а вывод должен совпадать
+        if "<content-ref" not in current.html and _is_plain_text(current.html):
+            assembled[id(current)] = current.html
+            continue
+
+        # Парсим HTML блока и находим ссылки на дочерние блоки
+        soup = BeautifulSoup(current.html, "html.parser")
+        content_refs = soup.find_all("content-ref")
+        needed_ids = {ref.attrs["src"] for ref in content_refs}
+
+        # Собирать нужно только те дочерние блоки, на которые есть ссылки;
+        # словарь дает O(1) поиск по ID (первый блок с ID)
+        child_by_id = {}
+        for child in current.children:
+            if child.id in needed_ids and child.id not in child_by_id:
+                child_by_id[child.id] = child
+
+        stack.append((current, (soup, content_refs, child_by_id)))
+        stack.extend((child, None) for child in child_by_id.values())
+
+    return assembled[id(block)]
 
 def json_to_chunks(
-    block: JSONBlockOutput, image_blocks: set[str], page_id: int=0) -> FlatBlockOutput | List[FlatBlockOutput]:
+    block: JSONBlockOutput, image_blocks: set[str], page_id: int=0, images_cache: dict[int, dict] | None = None) -> FlatBlockOutput | List[FlatBlockOutput]:
     """
     Преобразует иерархический JSON блок в плоский формат.
     
@@ -128,6 +186,7 @@ def json_to_chunks(
         block: JSONBlockOutput блок для преобразования
         image_blocks: Множество типов блоков изображений
         page_id: ID текущей страницы
+        images_cache: Кэш collect_images по id(блока), общий для всех блоков страницы
         
     Возвращает:
         FlatBlockOutput или список FlatBlockOutput
@@ -136,11 +195,15 @@ def json_to_chunks(
     if block.block_type == "Page":
         children = block.children
         # Извлекаем page_id из строки ID
-        page_id = int(block.id.split("/")[-1])
-        return [json_to_chunks(child, image_blocks, page_id=page_id) for child in children]
+        page_id = int(block.id.rpartition("/")[2])
+        return [
+            json_to_chunks(child, image_blocks, page_id=page_id, images_cache=images_cache)
+            for child in children
+        ]
     else:
-        # Обычный блок - создаем плоское представление
-        return FlatBlockOutput(
+        # Обычный блок - создаем плоское представление; поля берутся из уже
+        # провалидированного JSONBlockOutput, поэтому повторная валидация не нужна
+        return FlatBlockOutput.model_construct(
             id=block.id,
             block_type=block.block_type,
             html=assemble_html_with_images(block, image_blocks),  # Собираем полный HTML
@@ -148,7 +211,7 @@ def json_to_chunks(
             polygon=block.polygon,
             bbox=block.bbox,
             section_hierarchy=block.section_hierarchy,
-            images=collect_images(block),  # Собираем все изображения
+            images=collect_images(block, images_cache),  # Собираем все изображения
         )
 
 
@@ -172,17 +235,20 @@ class ChunkRenderer(JSONRenderer):
         """
         # Рендерим документ в BlockOutput структуру
         document_output = document.render(self.block_config)
-        # Извлекаем JSON для каждой страницы
-        json_output = []
-        for page_output in document_output.children:
-            json_output.append(self.extract_json(document, page_output))
+        image_blocks = frozenset(str(block) for block in self.image_blocks)
 
-        # Преобразуем иерархический JSON в плоский список блоков верхнего уровня
+        # Объединяем блоки верхнего уровня всех страниц в один список
         chunk_output = []
-        for item in json_output:
-            # Конвертируем блок страницы в chunks
-            chunks = json_to_chunks(item, set([str(block) for block in self.image_blocks]))
-            chunk_output.extend(chunks)
+        try:
+            for page_output in document_output.children:
+                # Извлекаем JSON страницы и преобразуем его в плоский список блоков;
+                # кэш изображений живет только в пределах страницы
+                page_json = self.extract_json(document, page_output)
+                chunk_output.extend(
+                    json_to_chunks(page_json, image_blocks, images_cache={})
+                )
+        finally:
+            self.clear_image_cache()
 
         # Собираем информацию о страницах (bbox и polygon)
         page_info = {
@@ -190,8 +256,8 @@ class ChunkRenderer(JSONRenderer):
             for page in document.pages
         }
 
-        # Возвращаем результат
-        return ChunkOutput(
+        # Возвращаем результат (все поля сформированы рендерером, валидация не нужна)
+        return ChunkOutput.model_construct(
             blocks=chunk_output,
             page_info=page_info,
             metadata=self.generate_document_metadata(document, document_output),
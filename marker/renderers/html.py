@@ -16,7 +16,7 @@
 import textwrap
 
 from PIL import Image
-from typing import Annotated, Tuple
+from typing import Annotated, Iterator, Tuple
 
 from bs4 import BeautifulSoup, MarkupResemblesLocatorWarning
 from pydantic import BaseModel
@@ -34,6 +34,17 @@ warnings.filterwarnings("ignore", category=MarkupResemblesLocatorWarning)
 # Подавляем ошибку DecompressionBombError для больших изображений
 Image.MAX_IMAGE_PIXELS = None
 
+# Типы блоков, которым insert_block_id не добавляет ID (слишком детальные)
+_NO_BLOCK_ID_TYPES = frozenset((BlockTypes.Line, BlockTypes.Span))
+
+# Обрамление документа для потокового вывода (iter_html); совпадает с шаблоном
+# extract_html для содержимого без переводов строк
+_HTML_PROLOGUE = (
+    "\n<!DOCTYPE html>\n<html>\n    <head>\n        <meta charset=\"utf-8\" />\n"
+    "    </head>\n    <body>\n        "
+)
+_HTML_EPILOGUE = "\n    </body>\n</html>\n"
+
 
 class HTMLOutput(BaseModel):
     """
@@ -60,6 +71,7 @@ class HTMLRenderer(BaseRenderer):
     Атрибуты:
         page_blocks: Типы блоков, которые считаются страницами
         paginate_output: Добавлять ли div обертки для страниц с data-page-id
+        pretty_print: Форматировать ли итоговый HTML с отступами
     """
 
     page_blocks: Annotated[
@@ -70,6 +82,21 @@ class HTMLRenderer(BaseRenderer):
         bool,
         "Whether to paginate the output.",
     ] = False
+    pretty_print: Annotated[
+        bool,
+        "Whether to indent the output HTML. This re-parses the whole document.",
+    ] = False
+
+    def __init__(self, config=None):
+        """
+        Инициализирует рендерер с заданной конфигурацией.
+        
+        Аргументы:
+            config: Конфигурация в виде Pydantic модели или словаря
+        """
+        super().__init__(config)
+        # Множество для O(1) проверки типов блоков страниц
+        self._page_blocks_set = frozenset(self.page_blocks)
 
     def extract_image(self, document, image_id):
         """
@@ -105,7 +132,7 @@ class HTMLRenderer(BaseRenderer):
             BeautifulSoup: Модифицированный soup с block ID
         """
         # Пропускаем Line и Span блоки (слишком детальные)
-        if block_id.block_type in [BlockTypes.Line, BlockTypes.Span]:
+        if block_id.block_type in _NO_BLOCK_ID_TYPES:
             return soup
 
         if self.add_block_ids:
@@ -148,68 +175,135 @@ class HTMLRenderer(BaseRenderer):
         Возвращает:
             tuple: (HTML строка, словарь изображений {имя_файла: PIL.Image})
         """
-        # Парсим HTML
+        soup, images = self.extract_html_soup(document, document_output, level)
+        output = str(soup)
+        if level == 0:
+            output = self.merge_consecutive_tags(output, ("b", "i"))
+            output = self.merge_consecutive_math(
+                output
+            )  # Merge consecutive inline math tags
+            output = textwrap.dedent(f"""
+            <!DOCTYPE html>
+            <html>
+                <head>
+                    <meta charset="utf-8" />
+                </head>
+                <body>
+                    {output}
+                </body>
+            </html>
+""")
+
+        return output, images
+
+    def extract_html_soup(self, document, document_output, level=0):
+        """
+        Строит дерево BeautifulSoup блока с подставленными дочерними блоками.
+        
+        HTML каждого блока разбирается ровно один раз: деревья дочерних блоков
+        вставляются в родительское дерево напрямую, без сериализации в строку
+        и повторного разбора на каждом уровне вложенности.
+        
+        Аргументы:
+            document: Документ для извлечения
+            document_output: Выходные данные рендеринга блока
+            level: Уровень рекурсии (0 = корневой уровень)
+            
+        Возвращает:
+            tuple: (BeautifulSoup, словарь изображений {имя_файла: PIL.Image})
+        """
+        # Парсим HTML; дерево нужно и без ссылок, так как insert_block_id
+        # работает с тегами, но поиск content-ref без них пропускаем
         soup = BeautifulSoup(document_output.html, "html.parser")
+        images = {}
+        if "<content-ref" not in document_output.html:
+            return soup, images
 
         # Находим все ссылки на дочерние блоки
         content_refs = soup.find_all("content-ref")
         ref_block_id = None
-        images = {}
         for ref in content_refs:
             src = ref.get("src")
             sub_images = {}
-            content = ""
+            content = None
             for item in document_output.children:
                 if item.id == src:
-                    content, sub_images_ = self.extract_html(document, item, level + 1)
+                    content, sub_images_ = self.extract_html_soup(document, item, level + 1)
                     sub_images.update(sub_images_)
                     ref_block_id: BlockId = item.id
                     break
 
-            if ref_block_id.block_type in self.image_blocks:
+            if content is None:
+                content = BeautifulSoup("", "html.parser")
+
+            if ref_block_id.block_type in self._image_blocks_set:
                 if self.extract_images:
                     image = self.extract_image(document, ref_block_id)
                     image_name = f"{ref_block_id.to_path()}.{settings.OUTPUT_IMAGE_FORMAT.lower()}"
                     images[image_name] = image
-                    element = BeautifulSoup(
-                        f"<p>{content}<img src='{image_name}'></p>", "html.parser"
-                    )
-                    ref.replace_with(self.insert_block_id(element, ref_block_id))
+                    # <p>{content}<img src='{image_name}'></p>; обертку создаем прямо
+                    # в текущем дереве (без пустого BeautifulSoup) и сразу ставим
+                    # data-block-id, без поиска внешнего тега
+                    wrapper = soup.new_tag("p")
+                    if self.add_block_ids:
+                        wrapper["data-block-id"] = str(ref_block_id)
+                    wrapper.append(content)
+                    wrapper.append(soup.new_tag("img", attrs={"src": image_name}))
+                    ref.replace_with(wrapper)
                 else:
                     # This will be the image description if using llm mode, or empty if not
-                    element = BeautifulSoup(f"{content}", "html.parser")
-                    ref.replace_with(self.insert_block_id(element, ref_block_id))
-            elif ref_block_id.block_type in self.page_blocks:
+                    ref.replace_with(self.insert_block_id(content, ref_block_id))
+            elif ref_block_id.block_type in self._page_blocks_set:
                 images.update(sub_images)
                 if self.paginate_output:
-                    content = f"<div class='page' data-page-id='{ref_block_id.page_id}'>{content}</div>"
-                element = BeautifulSoup(f"{content}", "html.parser")
-                ref.replace_with(self.insert_block_id(element, ref_block_id))
+                    # <div class='page' data-page-id='{page_id}'>{content}</div>
+                    attrs = {"class": "page", "data-page-id": str(ref_block_id.page_id)}
+                    if self.add_block_ids:
+                        attrs["data-block-id"] = str(ref_block_id)
+                    wrapper = soup.new_tag("div", attrs=attrs)
+                    wrapper.append(content)
+                    ref.replace_with(wrapper)
+                else:
+                    ref.replace_with(self.insert_block_id(content, ref_block_id))
             else:
                 images.update(sub_images)
-                element = BeautifulSoup(f"{content}", "html.parser")
-                ref.replace_with(self.insert_block_id(element, ref_block_id))
+                ref.replace_with(self.insert_block_id(content, ref_block_id))
 
-        output = str(soup)
-        if level == 0:
-            output = self.merge_consecutive_tags(output, "b")
-            output = self.merge_consecutive_tags(output, "i")
-            output = self.merge_consecutive_math(
-                output
-            )  # Merge consecutive inline math tags
-            output = textwrap.dedent(f"""
-            <!DOCTYPE html>
-            <html>
-                <head>
-                    <meta charset="utf-8" />
-                </head>
-                <body>
-                    {output}
-                </body>
-            </html>
-""")
+        return soup, images
 
-        return output, images
+    def iter_html(self, document, images: dict | None = None) -> Iterator[str]:
+        """
+        Потоково выдает HTML документа: пролог, фрагмент каждой страницы, эпилог.
+        
+        Страницы рендерятся и отдаются по одной, поэтому весь документ не
+        собирается в одну строку - части можно сразу писать в файл или сокет.
+        Слияние последовательных тегов выполняется в пределах страницы.
+        
+        Аргументы:
+            document: Document для рендеринга
+            images: Необязательный словарь, в который добавляются извлеченные
+                изображения {имя_файла: PIL.Image}
+            
+        Возвращает:
+            Iterator[str]: Части HTML документа по порядку
+        """
+        document_output = document.render(self.block_config)
+        yield _HTML_PROLOGUE
+        for page_output in document_output.children:
+            # Корень с единственной ссылкой на страницу: обертки и block IDs
+            # строятся так же, как при рендеринге всего документа
+            page_root = document_output.model_copy(
+                update={
+                    "html": f"<content-ref src='{page_output.id}'></content-ref>",
+                    "children": [page_output],
+                }
+            )
+            soup, page_images = self.extract_html_soup(document, page_root)
+            if images is not None:
+                images.update(page_images)
+            fragment = self.merge_consecutive_tags(str(soup), ("b", "i"))
+            yield self.merge_consecutive_math(fragment)
+        yield _HTML_EPILOGUE
 
     def __call__(self, document) -> HTMLOutput:
         """
@@ -225,11 +319,13 @@ class HTMLRenderer(BaseRenderer):
         document_output = document.render(self.block_config)
         # Извлекаем HTML и изображения
         full_html, images = self.extract_html(document, document_output)
-        # Форматируем HTML с отступами
-        soup = BeautifulSoup(full_html, "html.parser")
-        full_html = soup.prettify()  # Добавляем отступы для читаемости
-        # Возвращаем результат
-        return HTMLOutput(
+        # Форматирование с отступами требует повторного разбора всего документа,
+        # поэтому выполняется только по запросу
+        if self.pretty_print:
+            soup = BeautifulSoup(full_html, "html.parser")
+            full_html = soup.prettify()  # Добавляем отступы для читаемости
+        # Возвращаем результат (все поля сформированы рендерером, валидация не нужна)
+        return HTMLOutput.model_construct(
             html=full_html,
             images=images,
             metadata=self.generate_document_metadata(document, document_output),
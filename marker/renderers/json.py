@@ -13,11 +13,11 @@ bbox, section hierarchy и изображения в base64.
 - Метаданные документа и страниц
 """
 
-from typing import Annotated, Dict, List, Tuple
+from typing import Annotated, Dict, Iterator, List, Tuple
 
-from pydantic import BaseModel
+from pydantic import BaseModel, field_serializer
 
-from marker.renderers import BaseRenderer
+from marker.renderers import BaseRenderer, resolve_images
 from marker.schema import BlockTypes
 from marker.schema.blocks import Block, BlockOutput
 from marker.schema.document import Document
@@ -47,6 +47,11 @@ class JSONBlockOutput(BaseModel):
     section_hierarchy: Dict[int, str] | None = None
     images: dict | None = None
 
+    @field_serializer("images")
+    def serialize_images(self, images: dict | None):
+        # Отложенные изображения (lazy_image_encoding) кодируются при сериализации
+        return resolve_images(images)
+
 
 class JSONOutput(BaseModel):
     """
@@ -74,10 +79,14 @@ def reformat_section_hierarchy(section_hierarchy):
     Возвращает:
         dict: Реформатированный словарь со строковыми значениями
     """
-    new_section_hierarchy = {}
-    for key, value in section_hierarchy.items():
-        new_section_hierarchy[key] = str(value)
-    return new_section_hierarchy
+    # Результат всегда новый словарь: исходный может быть общим для многих блоков,
+    # а JSONBlockOutput создается без валидации (и без копирования полей)
+    if not section_hierarchy:
+        return {}
+    # Уже строковые значения - достаточно быстрой копии
+    if all(isinstance(value, str) for value in section_hierarchy.values()):
+        return dict(section_hierarchy)
+    return {key: str(value) for key, value in section_hierarchy.items()}
 
 
 class JSONRenderer(BaseRenderer):
@@ -103,10 +112,12 @@ class JSONRenderer(BaseRenderer):
 
     def extract_json(self, document: Document, block_output: BlockOutput):
         """
-        Рекурсивно извлекает JSON представление блока.
+        Извлекает JSON представление блока и всех его потомков.
         
         Для листовых блоков (наследников Block) извлекает HTML и изображения.
-        Для контейнерных блоков рекурсивно обрабатывает дочерние блоки.
+        Контейнерные блоки собираются после своих дочерних блоков. Обход
+        итеративный (явный стек), поэтому глубина дерева не ограничена стеком
+        вызовов Python.
         
         Аргументы:
             document: Документ для извлечения данных
@@ -115,41 +126,89 @@ class JSONRenderer(BaseRenderer):
         Возвращает:
             JSONBlockOutput: JSON представление блока
         """
-        # Получаем класс блока
-        cls = get_block_class(block_output.id.block_type)
-        # Листовой блок (прямой наследник Block)
-        if cls.__base__ == Block:
-            # Извлекаем HTML и изображения
-            html, images = self.extract_block_html(document, block_output)
-            return JSONBlockOutput(
-                html=html,
-                polygon=block_output.polygon.polygon,
-                bbox=block_output.polygon.bbox,
-                id=str(block_output.id),
-                block_type=str(block_output.id.block_type),
-                images=images,
-                section_hierarchy=reformat_section_hierarchy(
-                    block_output.section_hierarchy
-                ),
-            )
-        else:
-            # Контейнерный блок - рекурсивно обрабатываем детей
-            children = []
-            for child in block_output.children:
-                child_output = self.extract_json(document, child)
-                children.append(child_output)
-
-            return JSONBlockOutput(
-                html=block_output.html,
-                polygon=block_output.polygon.polygon,
-                bbox=block_output.polygon.bbox,
-                id=str(block_output.id),
-                block_type=str(block_output.id.block_type),
-                children=children,
-                section_hierarchy=reformat_section_hierarchy(
-                    block_output.section_hierarchy
-                ),
-            )
+        # Поля берутся из уже типизированного BlockOutput, поэтому модели создаются
+        # через model_construct, без повторной валидации каждого блока
+        results = []  # готовые JSONBlockOutput; дети контейнера лежат подряд в конце
+        # Типов блоков всего несколько десятков: запоминаем, какие из них листовые,
+        # чтобы не обращаться к реестру (import_module + getattr) на каждый блок.
+        # Кэш живет в пределах вызова, так что перерегистрация классов учитывается
+        is_leaf_type = {}
+        # Элементы стека: (блок, True) - дети контейнера уже обработаны
+        stack = [(block_output, False)]
+        while stack:
+            current, children_done = stack.pop()
+            block_id = current.id
+            polygon = current.polygon
+            if children_done:
+                # Забираем результаты дочерних блоков (в исходном порядке)
+                split = len(results) - len(current.children)
+                children = results[split:]
+                del results[split:]
+                results.append(
+                    JSONBlockOutput.model_construct(
+                        html=current.html,
+                        polygon=polygon.polygon,
+                        bbox=polygon.bbox,
+                        id=str(block_id),
+                        block_type=str(block_id.block_type),
+                        children=children,
+                        section_hierarchy=reformat_section_hierarchy(
+                            current.section_hierarchy
+                        ),
+                    )
+                )
+                continue
+
+            block_type = block_id.block_type
+            is_leaf = is_leaf_type.get(block_type)
+            if is_leaf is None:
+                # Листовой блок - прямой наследник Block
+                is_leaf = get_block_class(block_type).__base__ == Block
+                is_leaf_type[block_type] = is_leaf
+            if is_leaf:
+                # Извлекаем HTML и изображения
+                html, images = self.extract_block_html(document, current)
+                results.append(
+                    JSONBlockOutput.model_construct(
+                        html=html,
+                        polygon=polygon.polygon,
+                        bbox=polygon.bbox,
+                        id=str(block_id),
+                        block_type=str(block_type),
+                        images=images,
+                        section_hierarchy=reformat_section_hierarchy(
+                            current.section_hierarchy
+                        ),
+                    )
+                )
+            else:
+                # Контейнерный блок - сначала обрабатываем детей слева направо
+                stack.append((current, True))
+                stack.extend((child, False) for child in reversed(current.children))
+
+        return results[0]
+
+    def iter_pages(self, document: Document, document_output=None) -> Iterator[JSONBlockOutput]:
+        """
+        Последовательно выдает JSON представление каждой страницы документа.
+        
+        Позволяет сериализовать вывод постранично, не держа в памяти
+        JSON дерево всего документа.
+        
+        Аргументы:
+            document: Document для рендеринга
+            document_output: Готовый результат document.render (если уже есть)
+            
+        Возвращает:
+            Iterator[JSONBlockOutput]: JSON страниц в порядке документа
+        """
+        if document_output is None:
+            document_output = document.render(self.block_config)
+        try:
+            for page_output in document_output.children:
+                yield self.extract_json(document, page_output)
+        finally:
+            self.clear_image_cache()
 
     def __call__(self, document: Document) -> JSONOutput:
         """
@@ -164,11 +223,9 @@ class JSONRenderer(BaseRenderer):
         # Рендерим документ в BlockOutput структуру
         document_output = document.render(self.block_config)
         # Извлекаем JSON для каждой страницы
-        json_output = []
-        for page_output in document_output.children:
-            json_output.append(self.extract_json(document, page_output))
+        json_output = list(self.iter_pages(document, document_output))
         # Возвращаем результат с метаданными
-        return JSONOutput(
+        return JSONOutput.model_construct(
             children=json_output,
             metadata=self.generate_document_metadata(document, document_output),
         )
@@ -32,10 +32,22 @@ from marker.schema.document import Document
 
 logger = get_logger()
 
+# Предкомпилированные шаблоны (используются на каждом рендеринге и каждом <p>)
+_MULTI_NEWLINE_RE = re.compile(r"\n{3,}")
+_MULTI_NEWLINE_WS_RE = re.compile(r"(\n\s){3,}")
+_LINK_BRACKETS_RE = re.compile(r"([\[\]()])")
+# Перенос слова в конце абзаца, продолжающегося на следующей странице
+_HYPHENS = r"-—¬"
+_HYPHEN_END_RE = regex.compile(rf".*[\p{{Ll}}|\d][{_HYPHENS}]\s?$", regex.DOTALL)
+_HYPHEN_SPLIT_RE = regex.compile(rf"[{_HYPHENS}]\s?$")
+# Текст внутри этих тегов не экранируется
+_NO_ESCAPE_TAGS = frozenset(("pre", "code", "kbd", "samp", "math"))
+
 
 def escape_dollars(text):
     """Экранирует символы доллара для Markdown."""
-    return text.replace("$", r"\$")
+    # Проверка вхождения дешевле replace, а долларов в тексте обычно нет
+    return text.replace("$", r"\$") if "$" in text else text
 
 
 def cleanup_text(full_text):
@@ -49,9 +61,9 @@ def cleanup_text(full_text):
         str: Очищенный текст
     """
     # Заменяем 3+ переводов строк на два
-    full_text = re.sub(r"\n{3,}", "\n\n", full_text)
+    full_text = _MULTI_NEWLINE_RE.sub("\n\n", full_text)
     # Заменяем 3+ комбинаций \n\s на два перевода строки
-    full_text = re.sub(r"(\n\s){3,}", "\n\n", full_text)
+    full_text = _MULTI_NEWLINE_WS_RE.sub("\n\n", full_text)
     return full_text.strip()
 
 
@@ -86,15 +98,14 @@ def get_formatted_table_text(element):
             content_str = escape_dollars(str(content))
             text.append(content_str)
 
-    full_text = ""
+    # Части склеиваются одним join: пробел ставится между соседними частями,
+    # кроме соседства с <br>
+    parts = []
     for i, t in enumerate(text):
-        if t == "<br>":
-            full_text += t
-        elif i > 0 and text[i - 1] != "<br>":
-            full_text += " " + t
-        else:
-            full_text += t
-    return full_text
+        if t != "<br>" and i > 0 and text[i - 1] != "<br>":
+            parts.append(" ")
+        parts.append(t)
+    return "".join(parts)
 
 
 class Markdownify(MarkdownConverter):
@@ -146,15 +157,12 @@ class Markdownify(MarkdownConverter):
             return text
 
     def convert_p(self, el, text, parent_tags):
-        hyphens = r"-—¬"
         has_continuation = el.has_attr("class") and "has-continuation" in el["class"]
         if has_continuation:
             block_type = BlockTypes[el["block-type"]]
             if block_type in [BlockTypes.TextInlineMath, BlockTypes.Text]:
-                if regex.compile(
-                    rf".*[\p{{Ll}}|\d][{hyphens}]\s?$", regex.DOTALL
-                ).match(text):  # handle hypenation across pages
-                    return regex.split(rf"[{hyphens}]\s?$", text)[0]
+                if _HYPHEN_END_RE.match(text):  # handle hypenation across pages
+                    return _HYPHEN_SPLIT_RE.split(text)[0]
                 return f"{text} "
             if block_type == BlockTypes.ListGroup:
                 return f"{text}"
@@ -183,28 +191,41 @@ class Markdownify(MarkdownConverter):
         if self.html_tables_in_markdown:
             return "\n\n" + str(el) + "\n\n"
 
-        total_rows = len(el.find_all("tr"))
+        # Строки и их ячейки (с размахом) ищем в дереве один раз
+        table_rows = []
+        for row in el.find_all("tr"):
+            table_rows.append([
+                (cell, int(cell.get("rowspan", 1)), int(cell.get("colspan", 1)))
+                for cell in row.find_all(["td", "th"])
+            ])
+        total_rows = len(table_rows)
+
         colspans = []
         rowspan_cols = defaultdict(int)
-        for i, row in enumerate(el.find_all("tr")):
+        for i, cells in enumerate(table_rows):
             row_cols = rowspan_cols[i]
-            for cell in row.find_all(["td", "th"]):
-                colspan = int(cell.get("colspan", 1))
+            for _, rowspan, colspan in cells:
                 row_cols += colspan
-                for r in range(int(cell.get("rowspan", 1)) - 1):
+                for r in range(rowspan - 1):
                     rowspan_cols[i + r] += (
                         colspan  # Add the colspan to the next rows, so they get the correct number of columns
                     )
             colspans.append(row_cols)
         total_cols = max(colspans) if colspans else 0
 
-        grid = [[None for _ in range(total_cols)] for _ in range(total_rows)]
+        # Плоская сетка: ячейка (row, col) хранится в grid[row * total_cols + col]
+        grid = [None] * (total_rows * total_cols)
+        # Ширины столбцов считаем сразу при заполнении сетки: значение ячейки
+        # записывается один раз и не перезаписывается, а ячейки объединения
+        # пустые и на ширину не влияют
+        col_widths = [0] * total_cols
 
-        for row_idx, tr in enumerate(el.find_all("tr")):
+        for row_idx, cells in enumerate(table_rows):
+            row_base = row_idx * total_cols
             col_idx = 0
-            for cell in tr.find_all(["td", "th"]):
+            for cell, rowspan, colspan in cells:
                 # Skip filled positions
-                while col_idx < total_cols and grid[row_idx][col_idx] is not None:
+                while col_idx < total_cols and grid[row_base + col_idx] is not None:
                     col_idx += 1
 
                 # Fill in grid
@@ -214,67 +235,73 @@ class Markdownify(MarkdownConverter):
                     .replace("|", " ")
                     .strip()
                 )
-                rowspan = int(cell.get("rowspan", 1))
-                colspan = int(cell.get("colspan", 1))
 
                 if col_idx >= total_cols:
                     # Skip this cell if we're out of bounds
                     continue
 
-                for r in range(rowspan):
-                    for c in range(colspan):
-                        try:
-                            if r == 0 and c == 0:
-                                grid[row_idx][col_idx] = value
-                            else:
-                                grid[row_idx + r][col_idx + c] = (
-                                    ""  # Empty cell due to rowspan/colspan
-                                )
-                        except IndexError:
-                            # Sometimes the colspan/rowspan predictions can overflow
-                            logger.info(
-                                f"Overflow in columns: {col_idx + c} >= {total_cols} or rows: {row_idx + r} >= {total_rows}"
-                            )
-                            continue
+                if rowspan == 1 and colspan == 1:
+                    # Обычная ячейка без объединения - самый частый случай
+                    grid[row_base + col_idx] = value
+                    if len(value) > col_widths[col_idx]:
+                        col_widths[col_idx] = len(value)
+                    col_idx += 1
+                    continue
+
+                # Sometimes the colspan/rowspan predictions can overflow - clamp to the grid
+                r_end = min(row_idx + rowspan, total_rows)
+                c_end = min(col_idx + colspan, total_cols)
+                if r_end < row_idx + rowspan or c_end < col_idx + colspan:
+                    logger.info(
+                        f"Overflow in columns: {col_idx + colspan - 1} >= {total_cols} or rows: {row_idx + rowspan - 1} >= {total_rows}"
+                    )
+
+                if c_end > col_idx:
+                    # Empty cells due to rowspan/colspan: заполняем отрезок строки
+                    # одним присваиванием среза вместо цикла по столбцам
+                    span_cells = [""] * (c_end - col_idx)
+                    for r in range(row_idx, r_end):
+                        base = r * total_cols
+                        grid[base + col_idx:base + c_end] = span_cells
+                if r_end > row_idx and c_end > col_idx:
+                    grid[row_base + col_idx] = value
+                    if len(value) > col_widths[col_idx]:
+                        col_widths[col_idx] = len(value)
 
                 col_idx += colspan
 
-        markdown_lines = []
-        col_widths = [0] * total_cols
-        for row in grid:
-            for col_idx, cell in enumerate(row):
-                if cell is not None:
-                    col_widths[col_idx] = max(col_widths[col_idx], len(str(cell)))
+        # Строки сетки для вывода (при total_cols == 0 каждая строка пустая)
+        rows = [grid[r * total_cols:(r + 1) * total_cols] for r in range(total_rows)]
 
-        def add_header_line():
-            markdown_lines.append(
-                "|" + "|".join("-" * (width + 2) for width in col_widths) + "|"
-            )
+        # Строка-разделитель под заголовком одинакова для всей таблицы
+        header_line = "|" + "|".join("-" * (width + 2) for width in col_widths) + "|"
 
         # Generate markdown rows
+        markdown_lines = []
         added_header = False
-        for i, row in enumerate(grid):
+        for row in rows:
             is_empty_line = all(not cell for cell in row)
             if is_empty_line and not added_header:
                 # Skip leading blank lines
                 continue
 
-            line = []
-            for col_idx, cell in enumerate(row):
-                if cell is None:
-                    cell = ""
-                padding = col_widths[col_idx] - len(str(cell))
-                line.append(f" {cell}{' ' * padding} ")
-            markdown_lines.append("|" + "|".join(line) + "|")
+            markdown_lines.append(
+                "|"
+                + "|".join(
+                    f" {(cell or '').ljust(width)} "
+                    for cell, width in zip(row, col_widths)
+                )
+                + "|"
+            )
 
             if not added_header:
                 # Skip empty lines when adding the header row
-                add_header_line()
+                markdown_lines.append(header_line)
                 added_header = True
 
         # Handle one row tables
         if total_rows == 1:
-            add_header_line()
+            markdown_lines.append(header_line)
 
         table_md = "\n".join(markdown_lines)
         return "\n\n" + table_md + "\n\n"
@@ -282,7 +309,7 @@ class Markdownify(MarkdownConverter):
     def convert_a(self, el, text, parent_tags):
         text = self.escape(text)
         # Escape brackets and parentheses in text
-        text = re.sub(r"([\[\]()])", r"\\\1", text)
+        text = _LINK_BRACKETS_RE.sub(r"\\\1", text)
         return super().convert_a(el, text, parent_tags)
 
     def convert_span(self, el, text, parent_tags):
@@ -294,18 +321,23 @@ class Markdownify(MarkdownConverter):
     def escape(self, text, parent_tags=None):
         text = super().escape(text, parent_tags)
         if self.options["escape_dollars"]:
-            text = text.replace("$", r"\$")
+            text = escape_dollars(text)
         return text
 
     def process_text(self, el, parent_tags=None):
         text = six.text_type(el) or ""
 
+        # markdownify passes the names of all ancestor tags in parent_tags, so
+        # the checks below are set lookups instead of walks up the tree
+        if parent_tags is None:
+            parent_tags = {parent.name for parent in el.parents}
+
         # normalize whitespace if we're not inside a preformatted element
-        if not el.find_parent("pre"):
+        if "pre" not in parent_tags:
             text = re_whitespace.sub(" ", text)
 
         # escape special characters if we're not inside a preformatted or code element
-        if not el.find_parent(["pre", "code", "kbd", "samp", "math"]):
+        if parent_tags.isdisjoint(_NO_ESCAPE_TAGS):
             text = self.escape(text)
 
         # remove trailing whitespaces if any of the following condition is true:
@@ -129,71 +129,94 @@ class OCRJSONRenderer(BaseRenderer):
         pages = []
         # Обрабатываем каждую страницу документа
         for page in document.pages:
-            page_equations = [
-                b for b in page.children if b.block_type == BlockTypes.Equation
-                and not b.removed
-            ]
-            equation_lines = []
-            for equation in page_equations:
-                if not equation.structure:
+            # Один проход по блокам страницы: уравнения, строки и ID строк,
+            # входящих в уравнения
+            page_equations = []
+            candidate_lines = []
+            equation_line_ids = set()
+            for block in page.children:
+                if block.removed:
                     continue
+                if block.block_type == BlockTypes.Equation:
+                    page_equations.append(block)
+                    if block.structure:
+                        equation_line_ids.update(
+                            block_id
+                            for block_id in block.structure
+                            if block_id.block_type == BlockTypes.Line
+                        )
+                elif block.block_type == BlockTypes.Line:
+                    candidate_lines.append(block)
 
-                equation_lines += [
-                    line
-                    for line in equation.structure
-                    if line.block_type == BlockTypes.Line
-                ]
-
+            # Строки уравнений уже входят в Equation блоки
             page_lines = [
-                block
-                for block in page.children
-                if block.block_type == BlockTypes.Line
-                and block.id not in equation_lines
-                and not block.removed
+                block for block in candidate_lines if block.id not in equation_line_ids
             ]
 
+            # document.get_block на каждый ID ищет страницу перебором всех страниц;
+            # спаны и символы строки лежат на текущей странице, поэтому берем их
+            # из нее напрямую
+            page_get_block = page.get_block
+
+            def get_block(block_id, page_id=page.page_id):
+                if block_id.page_id == page_id:
+                    return page_get_block(block_id)
+                return document.get_block(block_id)
+
+            # Поля моделей берутся из уже типизированных блоков документа, поэтому
+            # выходные модели создаются через model_construct, без валидации
+            # (символов на странице - тысячи)
             lines = []
-            for line in page_lines + page_equations:
-                line_obj = OCRJSONLineOutput(
-                    id=str(line.id),
-                    block_type=str(line.block_type),
-                    html="",
-                    polygon=line.polygon.polygon,
-                    bbox=line.polygon.bbox,
+            # Обычные строки: текст и символы из спанов
+            for line in page_lines:
+                spans = (
+                    [get_block(span_id) for span_id in line.structure]
+                    if line.structure
+                    else []
                 )
-                if line in page_equations:
-                    line_obj.html = line.html
-                else:
-                    line_obj.html = line.formatted_text(document)
-                    spans = (
-                        [document.get_block(span_id) for span_id in line.structure]
-                        if line.structure
-                        else []
-                    )
-                    children = []
-                    for span in spans:
-                        if not span.structure:
-                            continue
-
-                        span_chars = [
-                            document.get_block(char_id) for char_id in span.structure
-                        ]
-                        children.extend(
-                            [
-                                OCRJSONCharOutput(
-                                    id=str(char.id),
-                                    block_type=str(char.block_type),
-                                    text=char.text,
-                                    polygon=char.polygon.polygon,
-                                    bbox=char.polygon.bbox,
-                                )
-                                for char in span_chars
-                            ]
+                children = []
+                for span in spans:
+                    if not span.structure:
+                        continue
+
+                    for char_id in span.structure:
+                        char = get_block(char_id)
+                        char_polygon = char.polygon
+                        children.append(
+                            OCRJSONCharOutput.model_construct(
+                                id=str(char.id),
+                                block_type=str(char.block_type),
+                                text=char.text,
+                                polygon=char_polygon.polygon,
+                                bbox=char_polygon.bbox,
+                            )
                         )
-                    line_obj.children = children
-                lines.append(line_obj)
+                line_polygon = line.polygon
+                lines.append(
+                    OCRJSONLineOutput.model_construct(
+                        id=str(line.id),
+                        block_type=str(line.block_type),
+                        html=line.formatted_text(document),
+                        polygon=line_polygon.polygon,
+                        bbox=line_polygon.bbox,
+                        children=children,
+                    )
+                )
+
+            # Уравнения: готовый HTML без разбивки на символы
+            for equation in page_equations:
+                equation_polygon = equation.polygon
+                lines.append(
+                    OCRJSONLineOutput.model_construct(
+                        id=str(equation.id),
+                        block_type=str(equation.block_type),
+                        html=equation.html,
+                        polygon=equation_polygon.polygon,
+                        bbox=equation_polygon.bbox,
+                    )
+                )
 
-            page = OCRJSONPageOutput(
+            page = OCRJSONPageOutput.model_construct(
                 id=str(page.id),
                 block_type=str(page.block_type),
                 polygon=page.polygon.polygon,
@@ -217,3 +217,29 @@ class PolygonBox(BaseModel):
             bbox[2] = max(bbox[2], bbox[0] + 1)
             bbox[3] = max(bbox[3], bbox[1] + 1)
         return cls(polygon=[[bbox[0], bbox[1]], [bbox[2], bbox[1]], [bbox[2], bbox[3]], [bbox[0], bbox[3]]])
+
+    @classmethod
+    def from_bbox_nz(cls, bbox: List[float], /) -> PolygonBox:
+        # Positional-only fast path of from_bbox(bbox, ensure_nonzero_area=True)
+        x0, y0, x1, y1 = bbox
+        if x1 < x0 + 1:
+            x1 = x0 + 1
+        if y1 < y0 + 1:
+            y1 = y0 + 1
+        # The nonzero-area fix guarantees the corner ordering the validator checks
+        return cls.model_construct(polygon=[[x0, y0], [x1, y0], [x1, y1], [x0, y1]])
+
+    @classmethod
+    def from_bbox_array(cls, bboxes, ensure_nonzero_area=False) -> List[PolygonBox]:
+        arr = np.array(bboxes, dtype=np.float64).reshape(-1, 4)
+        if not ensure_nonzero_area:
+            return [cls.from_bbox(bbox) for bbox in arr.tolist()]
+
+        # Vectorized nonzero-area fix; the resulting boxes always satisfy the corner
+        # ordering checked by the validator, so it is safe to skip validation
+        arr[:, 2] = np.maximum(arr[:, 2], arr[:, 0] + 1)
+        arr[:, 3] = np.maximum(arr[:, 3], arr[:, 1] + 1)
+        return [
+            cls.model_construct(polygon=[[x0, y0], [x1, y0], [x1, y1], [x0, y1]])
+            for x0, y0, x1, y1 in arr.tolist()
+        ]
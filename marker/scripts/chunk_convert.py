@@ -11,7 +11,6 @@ GPU для ускорения обработки больших объемов 
 import argparse
 import os
 import subprocess
-import pkg_resources
 
 
 def chunk_convert_cli():
@@ -32,8 +31,6 @@ def chunk_convert_cli():
     cur_dir = os.path.dirname(os.path.abspath(__file__))
     script_path = os.path.join(cur_dir, "chunk_convert.sh")
 
-    # Формируем команду для выполнения
-    cmd = f"{script_path} {args.in_folder} {args.out_folder}"
-
-    # Выполняем shell-скрипт
-    subprocess.run(cmd, shell=True, check=True)
\ No newline at end of file
+    # Запускаем скрипт напрямую, без промежуточного /bin/sh: аргументы
+    # передаются как есть, пробелы и спецсимволы в путях не интерпретируются
+    subprocess.run([script_path, args.in_folder, args.out_folder], check=True)
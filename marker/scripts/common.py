@@ -10,7 +10,6 @@
 """
 
 import ast
-import base64
 import io
 import re
 import sys
@@ -27,6 +26,7 @@ from marker.config.parser import ConfigParser
 from marker.config.printer import CustomClickPrinter
 from marker.models import create_model_dict
 from marker.settings import settings
+from marker.util import image_to_base64
 
 
 @st.cache_data()
@@ -120,13 +120,8 @@ def img_to_html(img, img_alt):
     Returns:
         str: HTML строка с изображением в формате base64
     """
-    # Сохраняем изображение в байтовый поток
-    img_bytes = io.BytesIO()
-    img.save(img_bytes, format=settings.OUTPUT_IMAGE_FORMAT)
-    img_bytes = img_bytes.getvalue()
-    
     # Кодируем изображение в base64
-    encoded = base64.b64encode(img_bytes).decode()
+    encoded = image_to_base64(img, settings.OUTPUT_IMAGE_FORMAT)
     
     # Создаем HTML тег img с настройками из конфигурации
     img_html = f'<img src="data:image/{settings.OUTPUT_IMAGE_FORMAT.lower()};base64,{encoded}" alt="{img_alt}" style="max-width: 100%;">'
@@ -201,10 +196,7 @@ def pillow_image_to_base64_string(img: Image) -> str:
     Returns:
         str: Base64 строка изображения в формате JPEG
     """
-    # Создаем буфер для сохранения изображения
-    buffered = io.BytesIO()
-    img.save(buffered, format="JPEG")
-    return base64.b64encode(buffered.getvalue()).decode("utf-8")
+    return image_to_base64(img, "JPEG")
 
 
 def extract_root_pydantic_class(schema_code: str) -> Optional[str]:
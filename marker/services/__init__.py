@@ -14,14 +14,12 @@
 """
 
 from typing import Optional, List, Annotated
-from io import BytesIO
 
 import PIL
 from pydantic import BaseModel
 
 from marker.schema.blocks import Block
-from marker.util import assign_config, verify_config_keys
-import base64
+from marker.util import assign_config, verify_config_keys, image_to_base64
 
 
 class BaseService:
@@ -61,12 +59,7 @@ class BaseService:
         Возвращает:
             str: Base64-кодированная строка изображения в UTF-8
         """
-        # Создаем буфер в памяти для сохранения изображения
-        image_bytes = BytesIO()
-        # Сохраняем изображение в буфер в указанном формате
-        img.save(image_bytes, format=format)
-        # Кодируем байты изображения в base64 и декодируем в строку UTF-8
-        return base64.b64encode(image_bytes.getvalue()).decode("utf-8")
+        return image_to_base64(img, format)
 
     def process_images(self, images: List[PIL.Image.Image]) -> list:
         """
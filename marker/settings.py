@@ -34,6 +34,15 @@ class Settings(BaseSettings):
     FONT_PATH: str = os.path.join(FONT_DIR, FONT_NAME)
     # Уровень логирования (DEBUG, INFO, WARNING, ERROR, CRITICAL)
     LOGLEVEL: str = "INFO"
+    # Директория кэша PDF, сконвертированных из HTML (ключ - хэш содержимого файла,
+    # его директории и версии WeasyPrint). None отключает кэш (по умолчанию)
+    HTML_PDF_CACHE_DIR: Optional[str] = None
+    # Максимальный размер кэша HTML->PDF в мегабайтах, старые файлы удаляются первыми
+    HTML_PDF_CACHE_MAX_MB: int = 1024
+
+    # Писать промежуточные PDF/HTML провайдеров в /dev/shm (tmpfs) вместо
+    # системной временной директории. Включайте, только если tmpfs достаточно велик
+    TEMP_DIR_USE_SHM: bool = False
 
     # ===== Общие настройки =====
     # Кодировка для выходных файлов
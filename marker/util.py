@@ -1,7 +1,9 @@
 # Модуль утилитарных функций для Marker
 # Содержит вспомогательные функции для работы с текстом, классами, конфигурацией и математическими тегами
 
+import base64
 import inspect
+import io
 import os
 from importlib import import_module
 from typing import List, Annotated
@@ -206,6 +208,27 @@ def parse_range_str(range_str: str) -> List[int]:
     return page_lst
 
 
+def image_to_base64(img, format: str) -> str:
+    """
+    Кодирует PIL изображение в base64 строку в заданном формате.
+    
+    Изображение сохраняется в буфер в памяти один раз, а base64 считается
+    прямо по содержимому буфера через getbuffer(), без промежуточной копии
+    байтов, которую создает getvalue().
+    
+    Аргументы:
+        img: PIL изображение для кодирования
+        format: Формат сохранения (JPEG, WEBP, PNG и т.д.)
+    
+    Возвращает:
+        Base64 строка закодированного изображения
+    """
+    image_buffer = io.BytesIO()
+    img.save(image_buffer, format=format)
+    # Результат base64 всегда ASCII
+    return base64.b64encode(image_buffer.getbuffer()).decode("ascii")
+
+
 def matrix_intersection_area(boxes1: List[List[float]], boxes2: List[List[float]]) -> np.ndarray:
     """
     Вычисляет матрицу площадей пересечений между двумя наборами прямоугольников.
@@ -0,0 +1,77 @@
+import openpyxl
+import pytest
+from PIL import Image
+from pptx import Presentation
+
+from marker.providers.registry import (
+    _is_html,
+    provider_from_ext,
+    provider_from_filepath,
+)
+
+
+@pytest.mark.parametrize(
+    "filename,provider_name",
+    [
+        ("scan.png", "ImageProvider"),
+        ("scan.PNG", "ImageProvider"),
+        ("photo.JpG", "ImageProvider"),
+        ("paper.PDF", "PdfProvider"),
+        ("report.DOCX", "DocumentProvider"),
+        ("table.Xlsx", "SpreadSheetProvider"),
+        ("slides.PPTX", "PowerPointProvider"),
+        ("book.EPUB", "EpubProvider"),
+        ("page.HTML", "HTMLProvider"),
+        ("unknown.xyz", "PdfProvider"),
+        ("no_extension", "PdfProvider"),
+    ],
+)
+def test_provider_from_ext(filename, provider_name):
+    assert provider_from_ext(filename).__name__ == provider_name
+
+
+@pytest.mark.parametrize(
+    "head,expected",
+    [
+        (b"<!DOCTYPE html><html><body>Hi</body></html>", True),
+        (b"\n  <html lang='en'>", True),
+        (b"<p>text</p>", True),
+        (b"<br/>", True),
+        (b"plain text, a < b and c > d", False),
+        (b"<123>", False),
+        (b"\xff\xfe<\x00h\x00t\x00m\x00l\x00>\x00", False),
+        # Обрезанный многобайтовый символ в конце буфера не мешает распознаванию
+        ("<html>привет".encode("utf-8")[:-1], True),
+    ],
+)
+def test_is_html(head, expected):
+    assert _is_html(head) is expected
+
+
+def test_provider_from_filepath_html_without_extension(tmp_path):
+    path = tmp_path / "page"
+    path.write_text("<!DOCTYPE html><html><body><p>Hello</p></body></html>")
+    assert provider_from_filepath(str(path)).__name__ == "HTMLProvider"
+
+
+def test_provider_from_filepath_text_falls_back_to_ext(tmp_path):
+    path = tmp_path / "notes.png"
+    path.write_text("just some text without markup")
+    assert provider_from_filepath(str(path)).__name__ == "ImageProvider"
+
+
+def test_provider_from_filepath_sniffs_image(tmp_path):
+    path = tmp_path / "image.bin"
+    Image.new("RGB", (8, 8)).save(path, format="PNG")
+    assert provider_from_filepath(str(path)).__name__ == "ImageProvider"
+
+
+def test_provider_from_filepath_sniffs_ooxml(tmp_path):
+    # Сигнатуры OOXML определяются по содержимому архива, а не по расширению
+    xlsx_path = tmp_path / "table.bin"
+    openpyxl.Workbook().save(xlsx_path)
+    assert provider_from_filepath(str(xlsx_path)).__name__ == "SpreadSheetProvider"
+
+    pptx_path = tmp_path / "slides.bin"
+    Presentation().save(pptx_path)
+    assert provider_from_filepath(str(pptx_path)).__name__ == "PowerPointProvider"
@@ -0,0 +1,59 @@
+import openpyxl
+
+from marker.providers.spreadsheet import SpreadSheetProvider
+
+
+def sheet_to_html(sheet, formula_sheet=None):
+    # Конвертация листа не зависит от состояния провайдера, __init__ не нужен
+    provider = SpreadSheetProvider.__new__(SpreadSheetProvider)
+    return provider._excel_to_html_table(sheet, formula_sheet)
+
+
+def test_xlsx_cells_are_html_escaped():
+    sheet = openpyxl.Workbook().active
+    sheet.append(["a < b & c", "<b>bold</b>", None])
+
+    html = sheet_to_html(sheet)
+
+    assert "<td>a &lt; b &amp; c</td>" in html
+    assert "<td>&lt;b&gt;bold&lt;/b&gt;</td>" in html
+    assert "<b>" not in html
+    assert "<td></td>" in html
+
+
+def test_xlsx_merged_cells():
+    sheet = openpyxl.Workbook().active
+    for row in range(1, 4):
+        sheet.append([f"r{row}c{col}" for col in range(1, 4)])
+    sheet.merge_cells("B2:C3")
+
+    html = sheet_to_html(sheet)
+
+    assert html == (
+        "<table>"
+        "<tr><td>r1c1</td><td>r1c2</td><td>r1c3</td></tr>"
+        '<tr><td>r2c1</td><td rowspan="2" colspan="2">r2c2</td></tr>'
+        "<tr><td>r3c1</td></tr>"
+        "</table>"
+    )
+
+
+def test_xlsx_formula_without_cached_value(tmp_path):
+    # openpyxl не вычисляет формулы, поэтому в сохраненной книге нет кэша значений
+    path = tmp_path / "formulas.xlsx"
+    workbook = openpyxl.Workbook()
+    workbook.active.append([1, 2, "=SUM(A1:B1)"])
+    workbook.save(path)
+
+    values, formulas = SpreadSheetProvider._load_workbooks(str(path))
+    try:
+        html = sheet_to_html(values.active)
+        html_with_formulas = sheet_to_html(values.active, formulas.active)
+    finally:
+        values.close()
+        formulas.close()
+
+    assert html == "<table><tr><td>1</td><td>2</td><td></td></tr></table>"
+    assert html_with_formulas == (
+        "<table><tr><td>1</td><td>2</td><td>=SUM(A1:B1)</td></tr></table>"
+    )
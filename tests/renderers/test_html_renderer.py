@@ -1,4 +1,5 @@
 import pytest
+from bs4 import BeautifulSoup
 
 from marker.renderers.html import HTMLRenderer
 
@@ -17,3 +18,13 @@ def test_html_renderer_block_ids(pdf_document, config):
 
     # Verify some block IDs are present
     assert "/page/0/Text/1" in html
+
+
+@pytest.mark.config({"page_range": [0], "disable_ocr": True})
+def test_html_renderer_pretty_print(pdf_document, config):
+    # По умолчанию HTML не форматируется с отступами
+    compact = HTMLRenderer(config)(pdf_document).html
+    pretty = HTMLRenderer({**config, "pretty_print": True})(pdf_document).html
+
+    assert compact != pretty
+    assert pretty == BeautifulSoup(compact, "html.parser").prettify()
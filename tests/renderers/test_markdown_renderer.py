@@ -1,4 +1,5 @@
 import pytest
+from bs4 import BeautifulSoup
 
 from marker.renderers.markdown import MarkdownRenderer
 from marker.schema import BlockTypes
@@ -86,3 +87,64 @@ def test_markdown_renderer_tables(pdf_document):
     renderer = MarkdownRenderer()
     md = renderer(pdf_document).markdown
     assert "54 <i>.45</i> 67<br>89 $x$" in md
+
+
+def table_html_to_markdown(html):
+    table = BeautifulSoup(html, "html.parser").find("table")
+    return MarkdownRenderer().md_cls.convert_table(table, "", set())
+
+
+@pytest.mark.parametrize(
+    "html,expected",
+    [
+        (
+            "<table><tr><th>A</th><th>Bee</th></tr><tr><td>1</td><td>2</td></tr></table>",
+            "| A | Bee |\n|---|-----|\n| 1 | 2   |",
+        ),
+        (
+            "<table><tr><td>only</td><td>row</td></tr></table>",
+            "| only | row |\n|------|-----|\n|------|-----|",
+        ),
+        (
+            "<table><tr><td>a|b</td><td>x\ny</td></tr>"
+            "<tr><td>$5</td><td><math>x</math></td></tr></table>",
+            "| a b | x y |\n|-----|-----|\n| \\$5 | $x$ |",
+        ),
+        # Пустые строки в начале таблицы пропускаются
+        (
+            "<table><tr><td></td><td></td></tr><tr><td>h1</td><td>h2</td></tr>"
+            "<tr><td>v1</td><td>v2</td></tr></table>",
+            "| h1 | h2 |\n|----|----|\n| v1 | v2 |",
+        ),
+        # colspan
+        (
+            "<table><tr><th colspan='2'>Wide</th><th>C</th></tr>"
+            "<tr><td>1</td><td>2</td><td>3</td></tr></table>",
+            "| Wide |   | C |\n|------|---|---|\n| 1    | 2 | 3 |",
+        ),
+        # rowspan
+        (
+            "<table><tr><td rowspan='2'>Tall</td><td>b1</td></tr><tr><td>b2</td></tr></table>",
+            "| Tall | b1 |\n|------|----|\n|      | b2 |",
+        ),
+        # rowspan и colspan одновременно
+        (
+            "<table><tr><td rowspan='2' colspan='2'>Big</td><td>x</td></tr>"
+            "<tr><td>y</td></tr><tr><td>p</td><td>q</td><td>r</td></tr></table>",
+            "| Big |   | x |\n|-----|---|---|\n|     |   | y |\n| p   | q | r |",
+        ),
+        # rowspan выходит за последнюю строку таблицы
+        (
+            "<table><tr><td rowspan='4'>a</td><td>b</td></tr><tr><td>c</td></tr></table>",
+            "| a | b |\n|---|---|\n|   | c |",
+        ),
+        # colspan выходит за последний столбец - обрезается по сетке
+        (
+            "<table><tr><td rowspan='2'>a</td><td>b</td><td>e</td></tr>"
+            "<tr><td colspan='3'>c</td></tr></table>",
+            "| a | b | e |\n|---|---|---|\n|   | c |   |",
+        ),
+    ],
+)
+def test_markdown_table_spans(html, expected):
+    assert table_html_to_markdown(html) == "\n\n" + expected + "\n\n"
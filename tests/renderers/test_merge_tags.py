@@ -0,0 +1,41 @@
+import pytest
+
+from marker.renderers import BaseRenderer
+
+
+@pytest.mark.parametrize(
+    "html,expected",
+    [
+        ("", ""),
+        ("no tags", "no tags"),
+        ("<b>a</b><b>b</b>", "<b>ab</b>"),
+        ("<b>a</b><b>b</b><b>c</b>", "<b>abc</b>"),
+        # Пробелы между тегами схлопываются в один пробел
+        ("<b>a</b> <b>b</b>", "<b>a b</b>"),
+        ("<b>a</b>\n  <b>b</b>", "<b>a b</b>"),
+        ("<b>x</b><b> </b><b>y</b>", "<b>x y</b>"),
+        # Текст между тегами прерывает серию
+        ("<b>a</b> x <b>b</b>", "<b>a</b> x <b>b</b>"),
+        ("<i>a</i><b>b</b>", "<i>a</i><b>b</b>"),
+    ],
+)
+def test_merge_consecutive_tags_single(html, expected):
+    assert BaseRenderer.merge_consecutive_tags(html, "b") == expected
+
+
+@pytest.mark.parametrize(
+    "html,expected",
+    [
+        ("<b>a</b><i>b</i>", "<b>a</b><i>b</i>"),
+        ("<b>a</b><i>b</i><b>c</b>", "<b>a</b><i>b</i><b>c</b>"),
+        ("<b>a</b> <b>b</b> <i>c</i><i>d</i>", "<b>a b</b> <i>cd</i>"),
+        # Вложенные теги сливаются изнутри наружу
+        ("<b><i>a</i></b><b><i>b</i></b>", "<b><i>ab</i></b>"),
+        ("<i><b>a</b></i><i><b>b</b></i>", "<i><b>ab</b></i>"),
+        ("<i><b>a</b></i> <i><b>b</b></i>", "<i><b>a b</b></i>"),
+        # Чередующиеся серии b/i сливаются полностью за один проход
+        ("<b>a</b></i><i><b>b</b>", "<b>ab</b>"),
+    ],
+)
+def test_merge_consecutive_tags_bold_italic(html, expected):
+    assert BaseRenderer.merge_consecutive_tags(html, ("b", "i")) == expected
@@ -0,0 +1,19 @@
+from marker.schema.polygon import PolygonBox
+
+
+def test_from_bbox_nz_matches_from_bbox():
+    for bbox in [[0, 0, 10, 20], [5, 5, 5, 5], [3.5, 2.0, 3.7, 2.1]]:
+        expected = PolygonBox.from_bbox(bbox, ensure_nonzero_area=True)
+        assert PolygonBox.from_bbox_nz(bbox).polygon == expected.polygon
+
+
+def test_from_bbox_array_matches_from_bbox():
+    bboxes = [[0, 0, 10, 20], [5, 5, 5, 5], [3.5, 2.0, 3.7, 2.1]]
+    polygons = PolygonBox.from_bbox_array(bboxes, ensure_nonzero_area=True)
+    assert len(polygons) == len(bboxes)
+    for bbox, polygon in zip(bboxes, polygons):
+        expected = PolygonBox.from_bbox(bbox, ensure_nonzero_area=True)
+        assert polygon.polygon == expected.polygon
+        assert polygon.bbox == expected.bbox
+
+    assert PolygonBox.from_bbox_array([], ensure_nonzero_area=True) == []